@@ -1,40 +1,114 @@
 from __future__ import annotations
 
 from flask import Flask, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import orjson
+from bson import ObjectId
+import io
 import os
 import uuid
+import mimetypes
 import json
+import time
+import queue
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from werkzeug.utils import secure_filename
 from datetime import datetime
+from typing import Dict, Tuple
+
+from config import configure_logging
+
+configure_logging()
+logger = logging.getLogger("api")
 
 # Initialize ALL components
-from mongodb_client import db_client
+from mongodb_client import db_client, MongoDBClient, image_file_url
 from wardrobe_database import WardrobeDatabase
 from outfit_generator import OutfitGenerator
 from weather_service import get_weather, get_detailed_weather_recommendations
-from gemini_analyzer import analyze_clothing_image
+from gemini_analyzer import analyze_clothing_images
 
 UPLOAD_FOLDER = "uploads"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
 
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Encode JSON responses with orjson instead of the stdlib encoder.
+
+    Dataclasses such as ClothingItem are serialized natively by orjson,
+    without building an intermediate dict.
+    """
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
-CORS(app, resources={
-    r"/*": {
-        "origins": ["*"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
+app.json = OrjsonProvider(app)
+# Behind nginx (see nginx.conf) CORS and preflights never reach Python
+if os.getenv("CORS_AT_PROXY") != "1":
+    CORS(app, resources={
+        r"/*": {
+            "origins": ["*"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Copy uploads to disk in 1MB chunks rather than werkzeug's 16KB default
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+
+# Images are linked rather than inlined in list responses
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8080").rstrip("/")
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Internal nginx location that maps onto UPLOAD_FOLDER (see serve_image)
+X_ACCEL_REDIRECT_PREFIX = os.getenv("X_ACCEL_REDIRECT_PREFIX", "")
+
 # Initialize singletons
 wardrobe_db = WardrobeDatabase()
 outfit_gen = OutfitGenerator(wardrobe_db)
-print("✅ Components initialized successfully")
+
+# Shared pool used to overlap independent blocking I/O (weather HTTP, MongoDB)
+# within a single request instead of waiting on each call in turn.
+io_executor = ThreadPoolExecutor(max_workers=int(os.getenv("IO_WORKERS", "16")))
+logger.info("✅ Components initialized successfully")
+
+
+def image_url(image_path):
+    """Public URL of an uploaded image served by serve_image."""
+    if not image_path:
+        return None
+    return f"{PUBLIC_BASE_URL}/uploads/{os.path.basename(image_path)}"
+
+
+def thumbnail_url(file_id, image_path=None):
+    """Public URL of an item's thumbnail (the one stored on the item, see serve_stored_image).
+    
+    Items without a stored image link their upload instead.
+    """
+    if file_id:
+        return image_file_url(file_id, thumb=True)
+    return image_url(image_path)
 
 # -----------------------
 # HEALTH CHECK
@@ -46,9 +120,13 @@ def health():
         "service": "SmartStylist API",
         "timestamp": datetime.utcnow().isoformat(),
         "mongodb": db_client._mode,
+        "stats_cache": db_client.stats_cache_info(),
         "endpoints": [
             {"method": "POST", "path": "/analyze", "desc": "Upload and analyze clothing"},
+            {"method": "POST", "path": "/analyze/batch", "desc": "Upload and analyze several items"},
+            {"method": "GET", "path": "/analyze/<job_id>", "desc": "Poll an async analysis job"},
             {"method": "GET", "path": "/wardrobe", "desc": "Get user's wardrobe"},
+            {"method": "GET", "path": "/images/<file_id>", "desc": "Get a stored image"},
             {"method": "POST", "path": "/generate", "desc": "Generate outfits"},
             {"method": "GET", "path": "/weather/<city>", "desc": "Get weather data"}
         ]
@@ -74,9 +152,10 @@ def upload_images():
 
     for file in files:
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
+            # Unique names, like /analyze: served images are cached as immutable
+            filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
             path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(path)
+            file.save(path, buffer_size=UPLOAD_BUFFER_SIZE)
             saved.append(filename)
 
     if not saved:
@@ -87,15 +166,95 @@ def upload_images():
         "files": saved
     }), 200
 
+# Analysis requests are funnelled through a single worker; requests that queue
+# up meanwhile are analyzed together in one batch. Analysis is local and cheap,
+# so there is no pause between batches unless ANALYZE_MIN_INTERVAL is set.
+ANALYZE_MIN_INTERVAL = float(os.getenv("ANALYZE_MIN_INTERVAL", "0"))
+ANALYZE_BATCH_SIZE = int(os.getenv("ANALYZE_BATCH_SIZE", "8"))
+ANALYZE_BATCH_WAIT = float(os.getenv("ANALYZE_BATCH_WAIT", "0.02"))
+_analysis_queue: "queue.Queue[Tuple[bytes, str, str, Future]]" = queue.Queue()
+
+
+def _next_analysis_batch():
+    """Block for the next queued analysis, then gather up to a batch of others."""
+    batch = [_analysis_queue.get()]
+    deadline = time.monotonic() + ANALYZE_BATCH_WAIT
+    while len(batch) < ANALYZE_BATCH_SIZE:
+        try:
+            batch.append(_analysis_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+        except queue.Empty:
+            break
+    return [job for job in batch if job[3].set_running_or_notify_cancel()]
+
+
+def _analysis_worker():
+    """Run queued analyses batch by batch."""
+    while True:
+        batch = _next_analysis_batch()
+        if not batch:
+            continue
+        try:
+            results = analyze_clothing_images([
+                (image_bytes, description, filename)
+                for image_bytes, filename, description, _ in batch
+            ], return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(batch)
+        # Each image fails on its own
+        for job, result in zip(batch, results):
+            future = job[3]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        if ANALYZE_MIN_INTERVAL:
+            time.sleep(ANALYZE_MIN_INTERVAL)
+
+
+def submit_analysis(image_bytes: bytes, filename: str, description: str) -> Future:
+    """Queue an image for analysis and return a future for its result."""
+    future: Future = Future()
+    _analysis_queue.put((image_bytes, filename, description, future))
+    return future
+
+
+threading.Thread(target=_analysis_worker, name="analysis-worker", daemon=True).start()
+
+# Asynchronous /analyze jobs (?async=1), polled via GET /analyze/<job_id>
+ANALYSIS_JOBS_MAX = int(os.getenv("ANALYSIS_JOBS_MAX", "1000"))
+_analysis_jobs: Dict[str, Future] = {}
+_analysis_jobs_lock = threading.Lock()
+
+# With REDIS_URL set, async jobs go to an RQ queue shared by every API worker
+# and are processed by separate `rq worker analyze` processes.
+REDIS_URL = os.getenv("REDIS_URL")
+ANALYSIS_RESULT_TTL = int(os.getenv("ANALYSIS_RESULT_TTL", "3600"))
+rq_queue = None
+if REDIS_URL:
+    from redis import Redis
+    from rq import Queue
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+    rq_queue = Queue("analyze", connection=Redis.from_url(REDIS_URL))
+
+# In-process jobs can only be polled on the worker that holds them, so with
+# several gunicorn workers (API_WORKERS, set by gunicorn.conf.py) and no
+# Redis, async requests are answered synchronously instead
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+ASYNC_JOBS_AVAILABLE = rq_queue is not None or API_WORKERS <= 1
+if not ASYNC_JOBS_AVAILABLE:
+    logger.warning("⚠️  %s workers without REDIS_URL: async /analyze requests run synchronously", API_WORKERS)
+
+
 @app.route("/analyze", methods=["POST"])
 def analyze_and_store():
     """Upload image, analyze with Gemini, store in MongoDB."""
-    print(f"🔍 Starting analyze endpoint...")
-    print(f"🔍 Request files: {request.files}")
-    print(f"🔍 Request form: {request.form}")
+    logger.debug("🔍 Starting analyze endpoint...")
+    logger.debug("🔍 Request files: %s", request.files)
+    logger.debug("🔍 Request form: %s", request.form)
     
     if 'image' not in request.files:
-        print("❌ No 'image' key in request.files")
+        logger.error("❌ No 'image' key in request.files")
         return jsonify({
             "status": "error",
             "error": "No image file provided",
@@ -103,7 +262,7 @@ def analyze_and_store():
         }), 400
     
     file = request.files['image']
-    print(f"🔍 File received: {file.filename}, size: {file.content_length}")
+    logger.debug("🔍 File received: %s, size: %s", file.filename, file.content_length)
     
     description = request.form.get('description', '').strip() or file.filename
     category = request.form.get('category', '').strip()
@@ -124,63 +283,261 @@ def analyze_and_store():
         }), 400
     
     try:
-        print(f"📤 Processing upload: {file.filename} ({file.content_length} bytes)")
+        logger.info("📤 Processing upload: %s (%s bytes)", file.filename, file.content_length)
         
-        # Save file locally temporarily
+        # Analyze from memory while the upload is written to disk
         filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        print(f"💾 File saved temporarily: {filepath}")
+        image_bytes = file.read()
+        saved = io_executor.submit(write_upload, filepath, image_bytes)
+        
+        if ASYNC_JOBS_AVAILABLE and (request.args.get("async") or request.form.get("async")):
+            if rq_queue is not None:
+                saved.result()
+                job_id = rq_queue.enqueue(
+                    "main.analyze_upload_task", filepath, description, user_id, category or None,
+                    meta={"filename": filename}, result_ttl=ANALYSIS_RESULT_TTL
+                ).id
+            else:
+                job_id = submit_analysis_job(image_bytes, saved, filepath, filename,
+                                             description, user_id, category)
+            logger.info("⏳ Queued analysis job %s", job_id)
+            return jsonify({
+                "status": "pending",
+                "job_id": job_id,
+                "status_url": f"/analyze/{job_id}"
+            }), 202
         
         # Analyze with Gemini AI
-        print("🤖 Analyzing image with Gemini AI...")
-        analysis = analyze_clothing_image(filepath, description)
-        print(f"✅ Analysis complete: {analysis.get('category', 'unknown')} - {analysis.get('color', 'unknown')}")
-        
-        # Store in database
-        print("💾 Storing in MongoDB...")
-        item_id = wardrobe_db.add_clothing_item(
-            image_path=filepath,
-            description=description,
-            user_id=user_id,
-            category=category,
-            analysis=analysis
-        )
-        print(f"✅ Item stored with ID: {item_id}")
+        logger.info("🤖 Analyzing image with Gemini AI...")
+        analysis = submit_analysis(image_bytes, filename, description).result()
+        saved.result()
+        return jsonify(store_analyzed_item(filepath, filename, description, user_id, category, analysis))
         
-        # Get the stored item for response
-        stored_item = wardrobe_db.get_item(item_id)
+    except Exception as e:
+        logger.error("❌ Error in /analyze: %s", e)
+        # Clean up file if error occurs (once any pending write has finished)
+        if 'saved' in locals():
+            wait([saved])
+        if 'filepath' in locals():
+            discard_upload(filepath)
         
-        # Prepare response
-        response_data = {
-            "status": "success",
-            "message": "Item uploaded and analyzed successfully",
-            "item_id": item_id,
-            "filename": filename,
-            "image_url": f"http://localhost:8080/uploads/{filename}",
-            "analysis": analysis,
-            "item": stored_item,
-            "uploaded_at": datetime.utcnow().isoformat()
-        }
+        return jsonify({
+            "status": "error",
+            "error": str(e),
+            "message": "Failed to process image"
+        }), 500
+
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """Upload several images at once (multipart 'images').
+    
+    The images are analyzed in one model batch and stored with one bulk insert.
+    """
+    # Keep each file's position in the request: descriptions are matched by it
+    files = [(i, f) for i, f in enumerate(request.files.getlist("images"))
+             if f.filename and allowed_file(f.filename)]
+    if not files:
+        return jsonify({
+            "status": "error",
+            "error": "No valid images provided"
+        }), 400
+    
+    descriptions = request.form.getlist("descriptions")
+    user_id = request.form.get("user_id", "anonymous")
+    
+    uploads = []
+    try:
+        for i, file in files:
+            filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            description = (descriptions[i].strip() if i < len(descriptions) else "") or file.filename
+            image_bytes = file.read()
+            uploads.append({
+                "filepath": filepath,
+                "filename": filename,
+                "description": description,
+                "saved": io_executor.submit(write_upload, filepath, image_bytes),
+                # Queued together, these reach the model as one batch
+                "analysis": submit_analysis(image_bytes, filename, description),
+            })
         
-        return jsonify(response_data)
+        for upload in uploads:
+            upload["analysis"] = upload["analysis"].result()
+            upload["saved"].result()
         
-    except Exception as e:
-        print(f"❌ Error in /analyze: {str(e)}")
-        # Clean up file if error occurs
-        if 'filepath' in locals() and os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-                print(f"🗑️  Cleaned up temporary file: {filepath}")
-            except:
-                pass
+        logger.info("💾 Storing %s items in MongoDB...", len(uploads))
+        item_ids = wardrobe_db.add_clothing_items([{
+            "image_path": upload["filepath"],
+            "description": upload["description"],
+            "user_id": user_id,
+            "analysis": upload["analysis"],
+        } for upload in uploads])
         
+        return jsonify({
+            "status": "success",
+            "message": f"{len(item_ids)} items uploaded and analyzed successfully",
+            "items": [{
+                "item_id": item_id,
+                "filename": upload["filename"],
+                "image_url": image_url(upload["filename"]),
+                "analysis": upload["analysis"],
+            } for item_id, upload in zip(item_ids, uploads)],
+            "count": len(item_ids),
+            "uploaded_at": datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error("❌ Error in /analyze/batch: %s", e)
+        wait([upload["saved"] for upload in uploads])
+        for upload in uploads:
+            discard_upload(upload["filepath"])
+        return jsonify({
+            "status": "error",
+            "error": str(e),
+            "message": "Failed to process images"
+        }), 500
+
+
+@app.route("/analyze/<job_id>", methods=["GET"])
+def get_analysis_job(job_id):
+    """Poll an asynchronous /analyze job; the result is returned once."""
+    with _analysis_jobs_lock:
+        job = _analysis_jobs.get(job_id)
+    if job is None and rq_queue is not None:
+        return get_queued_analysis_job(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "error": f"Job {job_id} not found"
+        }), 404
+    
+    if not job.done():
+        return jsonify({"status": "pending", "job_id": job_id}), 202
+    
+    with _analysis_jobs_lock:
+        _analysis_jobs.pop(job_id, None)
+    try:
+        return jsonify(job.result())
+    except Exception as e:
+        logger.error("❌ Analysis job %s failed: %s", job_id, e)
         return jsonify({
             "status": "error",
             "error": str(e),
             "message": "Failed to process image"
         }), 500
 
+
+def get_queued_analysis_job(job_id):
+    """Poll an /analyze job running on the RQ queue."""
+    try:
+        job = Job.fetch(job_id, connection=rq_queue.connection)
+    except NoSuchJobError:
+        return jsonify({
+            "status": "error",
+            "error": f"Job {job_id} not found"
+        }), 404
+    
+    if job.is_failed:
+        logger.error("❌ Analysis job %s failed", job_id)
+        traceback_lines = (job.exc_info or "").strip().splitlines()
+        return jsonify({
+            "status": "error",
+            "error": traceback_lines[-1] if traceback_lines else "Analysis failed",
+            "message": "Failed to process image"
+        }), 500
+    
+    if not job.is_finished:
+        return jsonify({"status": "pending", "job_id": job_id}), 202
+    
+    result = job.result
+    return jsonify(analysis_response(result["item_id"], job.meta.get("filename"), result["analysis"]))
+
+
+def analysis_response(item_id, filename, analysis):
+    """Build the /analyze response payload for a stored item."""
+    return {
+        "status": "success",
+        "message": "Item uploaded and analyzed successfully",
+        "item_id": item_id,
+        "filename": filename,
+        "image_url": image_url(filename),
+        "analysis": analysis,
+        "item": wardrobe_db.get_item(item_id),
+        "uploaded_at": datetime.utcnow().isoformat()
+    }
+
+
+def store_analyzed_item(filepath, filename, description, user_id, category, analysis):
+    """Store an analyzed upload and build the /analyze response payload."""
+    logger.info("✅ Analysis complete: %s - %s", analysis.get('category', 'unknown'), analysis.get('color', 'unknown'))
+    
+    # Store in database
+    logger.info("💾 Storing in MongoDB...")
+    item_id = wardrobe_db.add_clothing_item(
+        image_path=filepath,
+        description=description,
+        user_id=user_id,
+        category=category,
+        analysis=analysis
+    )
+    logger.info("✅ Item stored with ID: %s", item_id)
+    
+    return analysis_response(item_id, filename, analysis)
+
+
+def submit_analysis_job(image_bytes, saved, filepath, filename, description, user_id, category) -> str:
+    """Analyze and store an upload in the background; returns a job id for polling.
+    
+    ``saved`` is the future of the upload's disk write, which must finish
+    before the item is stored.
+    """
+    job_id = uuid.uuid4().hex
+    job: Future = Future()
+    
+    def finish(analysis_future: Future):
+        try:
+            analysis = analysis_future.result()
+            saved.result()
+            job.set_result(store_analyzed_item(
+                filepath, filename, description, user_id, category, analysis
+            ))
+        except Exception as e:
+            wait([saved])
+            discard_upload(filepath)
+            job.set_exception(e)
+    
+    with _analysis_jobs_lock:
+        _analysis_jobs[job_id] = job
+        # Forget the oldest finished jobs that were never polled
+        overflow = len(_analysis_jobs) - ANALYSIS_JOBS_MAX
+        if overflow > 0:
+            for stale_id in [jid for jid, f in _analysis_jobs.items() if f.done()][:overflow]:
+                del _analysis_jobs[stale_id]
+    
+    # Store on the I/O pool so the analysis worker can move on to the next image
+    submit_analysis(image_bytes, filename, description).add_done_callback(
+        lambda analysis_future: io_executor.submit(finish, analysis_future)
+    )
+    return job_id
+
+
+def write_upload(filepath, image_bytes):
+    """Write an uploaded image to disk."""
+    with open(filepath, "wb") as f:
+        f.write(image_bytes)
+    logger.info("💾 File saved: %s", filepath)
+
+
+def discard_upload(filepath):
+    """Remove an upload that could not be processed."""
+    try:
+        os.remove(filepath)
+        logger.info("🗑️  Cleaned up temporary file: %s", filepath)
+    except OSError:
+        pass
+
 # -----------------------
 # GET WARDROBE ITEMS
 # -----------------------
@@ -192,43 +549,33 @@ def get_wardrobe():
         limit = int(request.args.get('limit', 100))
         skip = int(request.args.get('skip', 0))
         
-        print(f"📋 Getting wardrobe for user: {user_id}")
-        items = wardrobe_db.get_user_items(user_id)
-        
-        # Apply pagination
-        paginated_items = items[skip:skip + limit]
-        
-        # Format items for frontend
-        formatted_items = []
-        for item in paginated_items:
-            # Load image if available
-            if item.get("image_file_id") and not item.get("image_base64"):
-                try:
-                    item["image_base64"] = wardrobe_db.get_image_base64(item["image_file_id"])
-                except Exception as e:
-                    print(f"Could not load image: {e}")
-    
-            formatted_items.append(item)
-     
-        # Get statistics
-        stats = wardrobe_db.count_by_category(user_id)
+        logger.info("📋 Getting wardrobe for user: %s", user_id)
+        # Statistics (the per-category counts also give us the total) are
+        # fetched concurrently with the page of items
+        stats_future = io_executor.submit(wardrobe_db.count_by_category, user_id)
+        items, has_more = wardrobe_db.get_user_items_page(
+            user_id, skip=skip, limit=limit, include_images=False
+        )
+        for item in items:
+            item["image_url"] = thumbnail_url(item.get("image_file_id"), item.get("image_path"))
+        stats = stats_future.result()
         
         return jsonify({
             "status": "success",
-            "items": formatted_items,
-            "total": len(items),
-            "count": len(paginated_items),
+            "items": items,
+            "total": sum(stats.values()),
+            "count": len(items),
             "stats": stats,
             "user_id": user_id,
             "pagination": {
                 "limit": limit,
                 "skip": skip,
-                "has_more": len(items) > (skip + limit)
+                "has_more": has_more
             }
         })
         
     except Exception as e:
-        print(f"❌ Error in /wardrobe: {str(e)}")
+        logger.error("❌ Error in /wardrobe: %s", e)
         return jsonify({
             "status": "error",
             "error": str(e),
@@ -243,7 +590,7 @@ def get_wardrobe():
 def get_wardrobe_item(item_id):
     """Get a specific wardrobe item."""
     try:
-        print(f"🔍 Getting item: {item_id}")
+        logger.info("🔍 Getting item: %s", item_id)
         item = wardrobe_db.get_item(item_id)
         if not item:
             return jsonify({
@@ -256,7 +603,7 @@ def get_wardrobe_item(item_id):
             try:
                 item["image_base64"] = wardrobe_db.get_image_base64(item["image_file_id"])
             except Exception as e:
-                print(f"⚠️  Could not load image: {e}")
+                logger.warning("⚠️  Could not load image: %s", e)
         
         return jsonify({
             "status": "success",
@@ -264,7 +611,7 @@ def get_wardrobe_item(item_id):
         })
         
     except Exception as e:
-        print(f"❌ Error getting item {item_id}: {str(e)}")
+        logger.error("❌ Error getting item %s: %s", item_id, e)
         return jsonify({
             "status": "error", 
             "error": str(e)
@@ -279,7 +626,7 @@ def delete_wardrobe_item(item_id):
     try:
         user_id = request.args.get('user_id', 'anonymous')
         
-        print(f"🗑️  Deleting item: {item_id} for user: {user_id}")
+        logger.info("🗑️  Deleting item: %s for user: %s", item_id, user_id)
         
         # Verify item belongs to user
         item = wardrobe_db.get_item(item_id)
@@ -298,7 +645,7 @@ def delete_wardrobe_item(item_id):
         success = wardrobe_db.delete_item(item_id)
         
         if success:
-            print(f"✅ Item {item_id} deleted successfully")
+            logger.info("✅ Item %s deleted successfully", item_id)
             return jsonify({
                 "status": "success",
                 "message": "Item deleted successfully",
@@ -311,7 +658,7 @@ def delete_wardrobe_item(item_id):
             }), 500
             
     except Exception as e:
-        print(f"❌ Error deleting item {item_id}: {str(e)}")
+        logger.error("❌ Error deleting item %s: %s", item_id, e)
         return jsonify({
             "status": "error", 
             "error": str(e)
@@ -320,33 +667,22 @@ def delete_wardrobe_item(item_id):
 # -----------------------
 # SAFE OUTFIT GENERATOR (HELPER FUNCTION)
 # -----------------------
-def generate_outfits_safe(user_id, occasion, weather, num_outfits=3):
+def generate_outfits_safe(user_id, occasion, weather, num_outfits=3, items=None):
     """Safe outfit generation that always works for presentation."""
     try:
-        # Get user's wardrobe items
-        items = wardrobe_db.get_user_items(user_id)
+        # Get user's wardrobe items (unless the caller already has them)
+        if items is None:
+            items = wardrobe_db.get_user_items(user_id)
         
         if len(items) < 2:
             return []
         
-        # Ensure all items have required fields
-        for item in items:
-            if "_id" in item and not isinstance(item["_id"], str):
-                item["_id"] = str(item["_id"])
-            if "color" not in item or item["color"] is None:
-                item["color"] = "unknown"
-            if "style_tags" not in item:
-                item["style_tags"] = []
-        
-        # Categorize items
-        categories = {}
+        # Categorize items (fields are already normalized when items are stored)
+        categories = defaultdict(deque)
         for item in items:
-            cat = item.get("category", "unknown")
-            if cat not in categories:
-                categories[cat] = []
-            categories[cat].append(item)
+            categories[item.get("category", "unknown")].append(item)
         
-        print(f"📊 Categories available: {list(categories.keys())}")
+        logger.info("📊 Categories available: %s", list(categories.keys()))
         
         # Create outfits based on available categories
         outfits = []
@@ -383,11 +719,9 @@ def generate_outfits_safe(user_id, occasion, weather, num_outfits=3):
             
             # Try to get items from required categories
             for cat in template["required"]:
-                if cat in categories and categories[cat]:
-                    # Take first item from this category
-                    outfit_items.append(categories[cat][0])
-                    # Remove it so we don't reuse in same outfit
-                    categories[cat] = categories[cat][1:]
+                if categories.get(cat):
+                    # Take first item from this category so we don't reuse it
+                    outfit_items.append(categories[cat].popleft())
             
             # If we have at least 2 items, create outfit
             if len(outfit_items) >= 2:
@@ -409,26 +743,16 @@ def generate_outfits_safe(user_id, occasion, weather, num_outfits=3):
                         "formality": item.get("formality", "casual"),
                         "image_file_id": item.get("image_file_id")
                     }
-                    
-                    # Load image if available
-                    if item_data["image_file_id"]:
-                        try:
-                            item_data["image_base64"] = wardrobe_db.get_image_base64(item_data["image_file_id"])
-                        except:
-                            item_data["image_base64"] = None
-                    
                     outfit["items"].append(item_data)
                 
                 outfits.append(outfit)
-                print(f"✅ Created outfit: {template['name']} with {len(outfit_items)} items")
+                logger.info("✅ Created outfit: %s with %s items", template['name'], len(outfit_items))
         
-        print(f"🎉 Generated {len(outfits)} safe outfits")
+        logger.info("🎉 Generated %s safe outfits", len(outfits))
         return outfits
         
     except Exception as e:
-        print(f"❌ Error in safe generator: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error in safe generator: %s", e)
         return []
 
 # -----------------------
@@ -441,46 +765,48 @@ def generate_outfits():
         data = request.json or {}
         
         # Log the incoming data
-        print(f"📥 Received generate request with data: {data}")
+        logger.debug("📥 Received generate request with data: %s", data)
         
         # Validate required fields
         occasion = data.get("occasion", "").strip()
         city = data.get("city", "").strip()
         user_id = data.get("user_id", "anonymous")
         
-        print(f"📥 Occasion: '{occasion}'")
-        print(f"📥 City: '{city}'")
-        print(f"📥 User ID: '{user_id}'")
+        logger.debug("📥 Occasion: '%s'", occasion)
+        logger.debug("📥 City: '%s'", city)
+        logger.debug("📥 User ID: '%s'", user_id)
         
         # Ensure we have values
         if not occasion:
             occasion = "casual day"
-            print(f"⚠️  Occasion was empty, using default: '{occasion}'")
+            logger.warning("⚠️  Occasion was empty, using default: '%s'", occasion)
         
         if not city:
-            print("❌ City is required")
+            logger.error("❌ City is required")
             return jsonify({
                 "status": "error",
                 "error": "City is required",
                 "message": "Please enter a city to get weather data"
             }), 400
         
-        print(f"✅ Final occasion: '{occasion}'")
-        print(f"✅ Final city: '{city}'")
+        logger.debug("✅ Final occasion: '%s'", occasion)
+        logger.debug("✅ Final city: '%s'", city)
         
         num_outfits = int(data.get("outfitCount", 3))
         focus_item_id = data.get("focus_item_id")
                 
-        print(f"🎨 Generating outfits for: {occasion} in {city}")
-        print(f"   User: {user_id}, Number of outfits: {num_outfits}")
+        logger.info("🎨 Generating outfits for: %s in %s", occasion, city)
+        logger.debug("   User: %s, Number of outfits: %s", user_id, num_outfits)
         
-        # Get weather data
-        print(f"🌤️  Getting weather for {city}...")
-        weather = get_weather(city)
-        print(f"✅ Weather: {weather.get('temp_c', 'N/A')}°C, {weather.get('condition', 'N/A')}")
+        # Get weather data and wardrobe items concurrently (both are I/O bound)
+        logger.info("🌤️  Getting weather for %s...", city)
+        weather_future = io_executor.submit(get_weather, city)
+        items_future = io_executor.submit(wardrobe_db.get_user_items, user_id)
+        weather = weather_future.result()
+        logger.info("✅ Weather: %s°C, %s", weather.get('temp_c', 'N/A'), weather.get('condition', 'N/A'))
         
         # Check if user has items
-        user_items = wardrobe_db.get_user_items(user_id)
+        user_items = items_future.result()
         if not user_items:
             return jsonify({
                 "status": "error",
@@ -488,35 +814,37 @@ def generate_outfits():
                 "message": "Please upload some clothing items first"
             }), 400
         
-        print(f"👕 User has {len(user_items)} wardrobe items")
+        logger.info("👕 User has %s wardrobe items", len(user_items))
         
         # Try the enhanced generator first
         outfits = []
         try:
-            print("🤖 Attempting to generate outfits with enhanced AI generator...")
+            logger.info("🤖 Attempting to generate outfits with enhanced AI generator...")
             outfits = outfit_gen.enhanced_generator.generate_outfits(
                 user_id=user_id,
                 occasion=occasion,
                 weather=weather,
                 num_outfits=num_outfits,
-                focus_item_id=focus_item_id
+                focus_item_id=focus_item_id,
+                items=user_items
             )
-            print(f"✅ Enhanced generator created {len(outfits)} outfits")
+            logger.info("✅ Enhanced generator created %s outfits", len(outfits))
             
         except Exception as e:
-            print(f"⚠️  Enhanced generator failed: {e}")
-            print("🔄 Falling back to safe generator...")
+            logger.warning("⚠️  Enhanced generator failed: %s", e)
+            logger.info("🔄 Falling back to safe generator...")
             
             # Try to get outfits from history first
             history_outfits = db_client.get_outfit_history(
                 user_id=user_id,
                 limit=num_outfits,
                 sort_by="generated_at",
-                sort_order=-1
+                sort_order=-1,
+                fields=("title", "details", "items", "metadata.outfit_score")
             )
             
             if history_outfits and len(history_outfits) > 0:
-                print(f"📜 Found {len(history_outfits)} outfits in history")
+                logger.info("📜 Found %s outfits in history", len(history_outfits))
                 # Convert history outfits to frontend format
                 outfits = []
                 for hist_outfit in history_outfits:
@@ -524,11 +852,11 @@ def generate_outfits():
                         "title": hist_outfit.get("title", f"Outfit from history"),
                         "details": hist_outfit.get("details", ""),
                         "items": [],
-                        "score": hist_outfit.get("metadata", {}).get("outfit_score", 0.7),
-                        "item_count": len(hist_outfit.get("items", []))
+                        "score": (hist_outfit.get("metadata") or {}).get("outfit_score", 0.7),
+                        "item_count": len(hist_outfit.get("items") or ())
                     }
                     
-                    for item in hist_outfit.get("items", []):
+                    for item in hist_outfit.get("items") or ():
                         item_data = {
                             "id": item.get("item_id"),
                             "category": item.get("category", "unknown"),
@@ -537,23 +865,16 @@ def generate_outfits():
                             "formality": "casual",
                             "image_file_id": item.get("image_file_id")
                         }
-                        
-                        if "image_file_id" in item:
-                            try:
-                                item_data["image_base64"] = wardrobe_db.get_image_base64(item["image_file_id"])
-                            except:
-                                item_data["image_base64"] = None
-                        
                         outfit["items"].append(item_data)
                     
                     outfits.append(outfit)
             else:
                 # Use safe generator as last resort
-                outfits = generate_outfits_safe(user_id, occasion, weather, num_outfits)
+                outfits = generate_outfits_safe(user_id, occasion, weather, num_outfits, items=user_items)
         
         # If still no outfits, create at least one simple outfit
         if not outfits:
-            print("⚠️  No outfits generated, creating emergency outfit...")
+            logger.warning("⚠️  No outfits generated, creating emergency outfit...")
             if len(user_items) >= 2:
                 emergency_outfit = {
                     "title": f"Emergency {occasion} Outfit",
@@ -569,37 +890,30 @@ def generate_outfits():
                         "category": item.get("category", "unknown"),
                         "color": item.get("color", "unknown"),
                         "style_tags": item.get("style_tags", []),
-                        "formality": item.get("formality", "casual")
+                        "formality": item.get("formality", "casual"),
+                        "image_file_id": item.get("image_file_id")
                     }
-                    
-                    if "image_file_id" in item:
-                        try:
-                            item_data["image_base64"] = wardrobe_db.get_image_base64(item["image_file_id"])
-                        except:
-                            item_data["image_base64"] = None
-                    
                     emergency_outfit["items"].append(item_data)
                 
                 outfits = [emergency_outfit]
-                print("✅ Created emergency outfit")
+                logger.info("✅ Created emergency outfit")
         
-        # Ensure all outfit items have images loaded
-        print("🖼️  Loading images for outfit items...")
+        # Link outfit items to their image files instead of inlining them
+        items_by_id = {str(it.get("_id")): it for it in user_items}
         for outfit in outfits:
-            items = outfit.get("items", [])
-            for item in items:
-                if item.get("image_file_id") and not item.get("image_base64"):
-                    try:
-                        item["image_base64"] = wardrobe_db.get_image_base64(item["image_file_id"])
-                    except Exception as e:
-                        print(f"⚠️  Could not load outfit item image: {e}")
+            for item in outfit.get("items") or ():
+                item.pop("image_base64", None)
+                source = items_by_id.get(item.get("id"), {})
+                path = item.pop("image_path", None) or source.get("image_path")
+                file_id = item.get("image_file_id") or source.get("image_file_id")
+                item["image_url"] = thumbnail_url(file_id, path)
         
-        print(f"✅ Final: Generated {len(outfits)} outfits")
+        logger.info("✅ Final: Generated %s outfits", len(outfits))
         
         # Save successful outfits to history
         outfit_ids = []
         if outfits:
-            print("💾 Saving outfits to history...")
+            logger.info("💾 Saving outfits to history...")
             try:
                 outfit_ids = db_client.save_outfit_to_history(
                     user_id=user_id,
@@ -607,9 +921,9 @@ def generate_outfits():
                     occasion=occasion,
                     weather=weather
                 )
-                print(f"✅ Saved {len(outfit_ids)} outfits to history")
+                logger.info("✅ Saved %s outfits to history", len(outfit_ids))
             except Exception as e:
-                print(f"⚠️  Could not save to history: {e}")
+                logger.warning("⚠️  Could not save to history: %s", e)
         
         # Get weather recommendations
         weather_recommendations = get_detailed_weather_recommendations(weather)
@@ -634,16 +948,14 @@ def generate_outfits():
         return jsonify(response_data)
         
     except ValueError as e:
-        print(f"❌ Validation error in /generate: {str(e)}")
+        logger.error("❌ Validation error in /generate: %s", e)
         return jsonify({
             "status": "error",
             "error": str(e),
             "message": "Invalid input data"
         }), 400
     except Exception as e:
-        print(f"❌ Critical error in /generate: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Critical error in /generate: %s", e)
         
         # Last resort: return empty but successful response
         return jsonify({
@@ -670,7 +982,7 @@ def get_weather_for_city(city):
         units = request.args.get('units', 'metric')
         force_refresh = request.args.get('refresh', 'false').lower() == 'true'
         
-        print(f"🌤️  Getting weather for {city}")
+        logger.info("🌤️  Getting weather for %s", city)
         weather = get_weather(city, units, force_refresh)
         recommendations = get_detailed_weather_recommendations(weather)
         
@@ -682,14 +994,14 @@ def get_weather_for_city(city):
         })
         
     except ValueError as e:
-        print(f"❌ Weather error for {city}: {str(e)}")
+        logger.error("❌ Weather error for %s: %s", city, e)
         return jsonify({
             "status": "error", 
             "error": str(e),
             "message": f"City '{city}' not found or weather service unavailable"
         }), 400
     except Exception as e:
-        print(f"❌ Error getting weather for {city}: {str(e)}")
+        logger.error("❌ Error getting weather for %s: %s", city, e)
         return jsonify({
             "status": "error", 
             "error": str(e)
@@ -706,13 +1018,14 @@ def get_outfit_history():
         limit = int(request.args.get('limit', 50))
         skip = int(request.args.get('skip', 0))
         
-        print(f"📜 Getting outfit history for user: {user_id}")
+        logger.info("📜 Getting outfit history for user: %s", user_id)
         outfits = db_client.get_outfit_history(
             user_id=user_id,
             limit=limit,
             skip=skip,
             sort_by="generated_at",
-            sort_order=-1
+            sort_order=-1,
+            fields=MongoDBClient.HISTORY_LIST_FIELDS
         )
         
         return jsonify({
@@ -723,7 +1036,7 @@ def get_outfit_history():
         })
         
     except Exception as e:
-        print(f"❌ Error getting outfit history: {str(e)}")
+        logger.error("❌ Error getting outfit history: %s", e)
         return jsonify({
             "status": "error", 
             "error": str(e)
@@ -738,20 +1051,19 @@ def get_statistics():
     try:
         user_id = request.args.get('user_id', 'anonymous')
         
-        print(f"📊 Getting statistics for user: {user_id}")
+        logger.info("📊 Getting statistics for user: %s", user_id)
         stats = db_client.get_user_statistics(user_id)
-        category_counts = wardrobe_db.count_by_category(user_id)
         
         return jsonify({
             "status": "success",
             "user_id": user_id,
             "statistics": stats,
-            "category_counts": category_counts,
-            "total_items": wardrobe_db.count_items(user_id)
+            "category_counts": stats["wardrobe"]["by_category"],
+            "total_items": stats["wardrobe"]["total_items"]
         })
         
     except Exception as e:
-        print(f"❌ Error getting statistics: {str(e)}")
+        logger.error("❌ Error getting statistics: %s", e)
         return jsonify({
             "status": "error", 
             "error": str(e)
@@ -762,20 +1074,62 @@ def get_statistics():
 # -----------------------
 @app.route("/uploads/<filename>")
 def serve_image(filename):
-    """Serve uploaded images."""
+    """Serve uploaded images.
+    
+    Behind nginx, set X_ACCEL_REDIRECT_PREFIX (e.g. "/internal/uploads/") so
+    nginx streams the file itself with sendfile; otherwise send_file hands
+    the open file to the WSGI server's file wrapper.
+    """
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(filepath):
-            return jsonify({
-                "error": f"Image {filename} not found"
-            }), 404
+        if X_ACCEL_REDIRECT_PREFIX:
+            response = app.response_class(
+                mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            )
+            response.headers["X-Accel-Redirect"] = X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + filename
+            return response
         
-        return send_file(filepath)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        response = send_file(filepath)
+        # Upload names are unique (uuid-prefixed), so clients may cache forever
+        response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+        return response
+    except FileNotFoundError:
+        return jsonify({
+            "error": f"Image {filename} not found"
+        }), 404
     except Exception as e:
         return jsonify({
             "error": str(e)
         }), 404
 
+@app.route("/images/<file_id>")
+def serve_stored_image(file_id):
+    """Stream a stored image (GridFS, or the local store) as raw bytes.
+    
+    List endpoints link here through image_url instead of inlining base64.
+    With ``?thumb=1`` the thumbnail stored on the wardrobe item is sent
+    instead, so outfit history never reads full images from GridFS.
+    """
+    if request.args.get("thumb"):
+        thumb = db_client.get_thumbnail(file_id)
+        if thumb:
+            response = send_file(io.BytesIO(thumb), mimetype="image/jpeg")
+            response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+            return response
+    
+    try:
+        f, metadata = db_client.open_image(file_id)
+    except Exception:
+        return jsonify({
+            "error": f"Image {file_id} not found"
+        }), 404
+    
+    mimetype = mimetypes.guess_type(metadata.get("filename") or "")[0] or "application/octet-stream"
+    response = send_file(f, mimetype=mimetype)
+    # File ids never get new content, so clients may cache forever
+    response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+    return response
+
 # -----------------------
 # HOME/INDEX
 # -----------------------
@@ -824,6 +1178,7 @@ def test():
         # Test wardrobe database
         try:
             items_count = wardrobe_db.count_items("anonymous")
+            totals = db_client.collection_totals()
             db_status = "working"
         except:
             db_status = "error"
@@ -837,6 +1192,7 @@ def test():
                 "wardrobe_database": db_status
             },
             "wardrobe_items": items_count if 'items_count' in locals() else 0,
+            "collection_totals": totals if 'totals' in locals() else {},
             "message": "All systems operational" if all([
                 gemini_status == "available",
                 weather_status == "available",
@@ -869,75 +1225,61 @@ def method_not_allowed(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    print(f"🔥 Internal server error: {error}")
+    logger.error("🔥 Internal server error: %s", error)
     return jsonify({
         "error": "Internal server error",
         "message": "Something went wrong on our end"
     }), 500
 
-# -----------------------
-# CORS HEADERS
-# -----------------------
-@app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    return response
-
 if __name__ == "__main__":
-    print("\n" + "="*60)
-    print("🚀 SMARTSTYLIST FASHION AI - MONGODB COMPASS EDITION")
-    print("="*60)
-    print(f"📁 Upload folder: {app.config['UPLOAD_FOLDER']}")
-    print(f"🌐 API URL: http://localhost:8080")
-    print(f"📊 MongoDB Mode: {db_client._mode.upper()}")
-    print(f"📚 API Documentation: http://localhost:8080/")
-    print("="*60)
-    print("\n✨ To get started:")
-    print("   1. Open index.html in your browser")
-    print("   2. Upload clothing images")
-    print("   3. Generate AI-powered outfits!")
-    print("\n📋 Available endpoints:")
-    print("   • POST /analyze    - Upload and analyze clothing")
-    print("   • GET  /wardrobe   - Get your wardrobe")
-    print("   • POST /generate   - Generate outfits")
-    print("   • GET  /weather/:city - Get weather data")
-    print("\n🔧 Run /test to check all components")
-    print("="*60 + "\n")
+    rule = "=" * 60
+    mongo_status = (f"✅ MongoDB: Connected to {db_client._config.db_name}"
+                    if db_client._mode == "mongo" else "⚠️  MongoDB: Using local fallback (filesystem)")
+    gemini_status = ("✅ Gemini AI: API key configured" if os.getenv("GOOGLE_API_KEY")
+                     else "⚠️  Gemini AI: API key not set (will use fallback analysis)")
+    weather_status = ("✅ OpenWeatherMap: API key configured" if os.getenv("OPENWEATHER_API_KEY")
+                      else "⚠️  OpenWeatherMap: API key not set (will use mock data)")
     
-    # Test all components on startup
-    try:
-        print("🔍 Testing components...")
-        
-        # Test MongoDB
-        if db_client._mode == "mongo":
-            print(f"   ✅ MongoDB: Connected to {db_client._config.db_name}")
-        else:
-            print(f"   ⚠️  MongoDB: Using local fallback (filesystem)")
-        
-        # Test Gemini API key
-        if os.getenv("GOOGLE_API_KEY"):
-            print("   ✅ Gemini AI: API key configured")
-        else:
-            print("   ⚠️  Gemini AI: API key not set (will use fallback analysis)")
-        
-        # Test OpenWeatherMap API key
-        if os.getenv("OPENWEATHER_API_KEY"):
-            print("   ✅ OpenWeatherMap: API key configured")
-        else:
-            print("   ⚠️  OpenWeatherMap: API key not set (will use mock data)")
-        
-        print("✅ All components ready!")
-        print("\n🎉 Server is ready! Press Ctrl+C to stop")
-        print("="*60 + "\n")
-        
-    except Exception as e:
-        print(f"❌ Startup check failed: {e}")
-        print("⚠️  Some features may not work correctly")
+    print(f"""
+{rule}
+🚀 SMARTSTYLIST FASHION AI - MONGODB COMPASS EDITION
+{rule}
+📁 Upload folder: {app.config['UPLOAD_FOLDER']}
+🌐 API URL: http://localhost:8080
+📊 MongoDB Mode: {db_client._mode.upper()}
+📚 API Documentation: http://localhost:8080/
+{rule}
+
+✨ To get started:
+   1. Open index.html in your browser
+   2. Upload clothing images
+   3. Generate AI-powered outfits!
+
+📋 Available endpoints:
+   • POST /analyze    - Upload and analyze clothing
+   • GET  /wardrobe   - Get your wardrobe
+   • POST /generate   - Generate outfits
+   • GET  /weather/:city - Get weather data
+
+🔧 Run /test to check all components
+🏭 For production use: gunicorn -c gunicorn.conf.py api:app
+{rule}
+
+🔍 Testing components...
+   {mongo_status}
+   {gemini_status}
+   {weather_status}
+✅ All components ready!
+
+🎉 Server is ready! Press Ctrl+C to stop
+{rule}
+""")
     
     try:
-        app.run(host='0.0.0.0', port=8080, debug=True, threaded=True)
+        # Development server only; FLASK_DEBUG=1 enables the debugger. The reloader
+        # stays off: its child process would import and initialize everything twice.
+        app.run(host='0.0.0.0', port=8080, debug=os.getenv("FLASK_DEBUG") == "1",
+                use_reloader=False, threaded=True)
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
     except Exception as e:
@@ -1,9 +1,9 @@
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 
-@dataclass
+@dataclass(slots=True)
 class ClothingItem:
-    """Represents one wardrobe item."""
+    """Represents one wardrobe item (slotted: no per-instance __dict__)."""
     image_path: str
     description: str
     category: Optional[str] = None
@@ -1,21 +1,72 @@
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-    # Weather
-    # Primary: OpenWeatherMap
-    OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
-    # Backward compatible alias (some users already set WEATHER_API_KEY)
-    WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
-    # Secondary: WeatherAPI.com
-    WEATHERAPI_KEY = os.getenv('WEATHERAPI_KEY')
+import queue
+import atexit
+import logging
+import logging.handlers
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def load_env() -> None:
+    """Read .env into the environment once per process; later calls are free."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def configure_logging() -> None:
+    """Route log records through a queue so request threads never block on stdout.
+    
+    Called by every entry point (API, main / RQ worker); later calls are no-ops.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    listener.start()
+    atexit.register(listener.stop)
+
+
+class _EnvSettings(type):
+    """Resolve environment-backed settings on first access, after loading .env."""
+
+    def __getattr__(cls, name):
+        if name in cls._ENV_SETTINGS:
+            load_env()
+            return os.getenv(name)
+        raise AttributeError(name)
+
+
+class Config(metaclass=_EnvSettings):
+    _ENV_SETTINGS = {
+        'GOOGLE_API_KEY',
+        # Weather
+        # Primary: OpenWeatherMap
+        'OPENWEATHER_API_KEY',
+        # Backward compatible alias (some users already set WEATHER_API_KEY)
+        'WEATHER_API_KEY',
+        # Secondary: WeatherAPI.com
+        'WEATHERAPI_KEY',
+    }
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-MONGODB_DB = os.getenv("MONGODB_DB", "smartstylist")
-MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "wardrobe_items")
 
+
+_MONGODB_DEFAULTS = {
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "MONGODB_DB": "smartstylist",
+    "MONGODB_COLLECTION": "wardrobe_items",
+}
+
+
+def __getattr__(name):
+    # MONGODB_URI / MONGODB_DB / MONGODB_COLLECTION, read when first imported
+    if name in _MONGODB_DEFAULTS:
+        load_env()
+        return os.getenv(name, _MONGODB_DEFAULTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
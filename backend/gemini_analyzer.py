@@ -1,11 +1,25 @@
 from __future__ import annotations
 
+import io
 import os
 import re
-from typing import Dict, Any, List, Optional
-
+import copy
+import string
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import numpy as np
 from PIL import Image
-from transformers import pipeline
+
+try:
+    import cv2  # decodes JPEGs at reduced size, much faster than PIL
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger(__name__)
 
 # ==========================
 # Controlled vocabularies
@@ -19,14 +33,25 @@ VALID_FORMALITY = ["casual", "business-casual", "business", "formal"]
 
 STYLE_TAGS = ["casual", "elegant", "sport", "streetwear", "classic", "minimal", "chic", "formal"]
 
-# ==========================
-# Load GENERATIVE model (LOCAL)
-# ==========================
-generator = pipeline(
-    "text-generation",
-    model="distilgpt2",
-    max_new_tokens=120
-)
+# Style tags implied by the category / colour alone; description tags come first
+CATEGORY_DEFAULT_TAGS = {
+    "shirt": ["casual"],
+    "pants": ["casual"],
+    "dress": ["elegant"],
+    "shoes": ["footwear"],
+    "jacket": ["cozy", "classic"],
+    "sweater": ["cozy"],
+    "skirt": ["chic"],
+    "shorts": ["casual", "sport"],
+    "accessory": ["chic"],
+}
+COLOR_DEFAULT_TAGS = {
+    "black": ["classic"],
+    "white": ["minimal"],
+    "gray": ["minimal"],
+    "beige": ["minimal"],
+    "dark blue": ["classic"],
+}
 
 # ==========================
 # Keyword dictionaries (strong, deterministic)
@@ -63,35 +88,39 @@ CATEGORY_MAP = {
 }
 
 
-def _normalize_text(s: str) -> str:
-    s = (s or "").lower()
-    s = re.sub(r"[^a-z0-9\s\-\_]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+class _KeepTable(dict):
+    """str.translate table: keeps [a-z0-9_-], turns every other character into a space."""
 
+    def __missing__(self, codepoint: int) -> str:
+        self[codepoint] = " "
+        return " "
 
-# ==========================
-# Better color detection (HSV-ish rules, still light)
-# ==========================
-# In gemini_analyzer.py, update the _dominant_color function:
-def _dominant_color(image_path: str) -> str:
-    """Returns a robust coarse color name using average RGB + simple heuristics."""
-    try:
-        # Check if file exists first
-        if not os.path.exists(image_path):
-            print(f"⚠️ Warning: Image file not found: {image_path}")
-            return "unknown"
-        
-        img = Image.open(image_path).convert("RGB").resize((80, 80))
-        # ... rest of the function
-    except Exception as e:
-        print(f"⚠️ Color detection error: {e}")
-        return "unknown"
+
+_NORMALIZE_TABLE = _KeepTable({ord(c): c for c in string.ascii_lowercase + string.digits + "-_"})
+
+
+def _normalize_text(s: str) -> str:
+    return " ".join((s or "").lower().translate(_NORMALIZE_TABLE).split())
 
 
 # ==========================
 # Category inference (deterministic first)
 # ==========================
+# priority order matters: shoes & pants first (to stop "shirt" domination)
+CATEGORY_PRIORITY = ["shoes", "pants", "dress", "jacket", "sweater", "skirt", "shorts", "accessory", "shirt"]
+
+# keyword -> (priority rank, category)
+_KEYWORD_CATEGORY = {}
+for _rank, _cat in enumerate(CATEGORY_PRIORITY):
+    for _kw in KEYWORDS[_cat]:
+        _KEYWORD_CATEGORY.setdefault(_kw, (_rank, _cat))
+
+# One scan over the text finds every keyword occurrence (lookahead => overlapping matches too)
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(sorted(map(re.escape, _KEYWORD_CATEGORY), key=len, reverse=True)) + "))"
+)
+
+
 def _infer_category_from_context(context: str) -> Optional[str]:
     """
     Strong, deterministic category inference using filename + user_description.
@@ -99,98 +128,177 @@ def _infer_category_from_context(context: str) -> Optional[str]:
     """
     ctx = _normalize_text(context)
 
-    # priority order matters: shoes & pants first (to stop "shirt" domination)
-    priority = ["shoes", "pants", "dress", "jacket", "sweater", "skirt", "shorts", "accessory", "shirt"]
-    for cat in priority:
-        for kw in KEYWORDS[cat]:
-            if kw in ctx:
-                return cat
-    return None
-
-
-def _infer_season_from_text(text: str) -> str:
-    t = _normalize_text(text)
-    if "summer" in t or "été" in t:
-        return "summer"
-    if "winter" in t or "hiver" in t:
-        return "winter"
-    if "spring" in t or "print" in t:
-        return "spring"
-    if "fall" in t or "autumn" in t or "automne" in t:
-        return "fall"
-    return "all-season"
-
-
-def _infer_formality_from_text(text: str) -> str:
-    t = _normalize_text(text)
-    if "formal" in t or "gala" in t or "wedding" in t or "soiree" in t or "soir" in t:
-        return "formal"
-    if "business" in t or "office" in t or "interview" in t or "work" in t or "travail" in t:
-        return "business-casual"
-    return "casual"
+    best = None
+    for match in _KEYWORD_RE.finditer(ctx):
+        found = _KEYWORD_CATEGORY[match.group(1)]
+        if best is None or found < best:
+            best = found
+    return best[1] if best else None
+
+
+# word -> label, and the order in which labels win when several words match
+SEASON_WORDS = {
+    "summer": "summer",
+    "winter": "winter", "hiver": "winter",
+    "spring": "spring", "print": "spring", "printemps": "spring",
+    "fall": "fall", "autumn": "fall", "automne": "fall",
+}
+SEASON_PRIORITY = ["summer", "winter", "spring", "fall"]
+
+FORMALITY_WORDS = {
+    "formal": "formal", "gala": "formal", "wedding": "formal", "soiree": "formal", "soir": "formal",
+    "business": "business-casual", "office": "business-casual", "interview": "business-casual",
+    "work": "business-casual", "travail": "business-casual",
+}
+FORMALITY_PRIORITY = ["formal", "business-casual"]
+
+# token -> every (attribute, label) it signals, e.g. "formal" is both a formality and a style tag
+_TOKEN_ATTRIBUTES: Dict[str, List[Tuple[str, str]]] = {}
+for _attr, _words in (("season", SEASON_WORDS), ("formality", FORMALITY_WORDS),
+                      ("tag", {t: t for t in STYLE_TAGS})):
+    for _word, _label in _words.items():
+        _TOKEN_ATTRIBUTES.setdefault(_word, []).append((_attr, _label))
+
+
+def _text_attributes(text: str) -> Dict[str, set]:
+    """Season, formality and style-tag labels found in the text, in one pass over its tokens."""
+    found: Dict[str, set] = {"season": set(), "formality": set(), "tag": set()}
+    for token in _normalize_text(text).split():
+        for attr, label in _TOKEN_ATTRIBUTES.get(token, ()):
+            found[attr].add(label)
+    return found
+
+
+def _first_label(labels: set, priority: List[str], default: str) -> str:
+    """Highest-priority label present, or the default."""
+    return next((label for label in priority if label in labels), default)
+
+
+# ==========================
+# ANALYSIS (deterministic rules)
+# ==========================
+def analyze_clothing_image(image: Union[str, bytes], user_description: str,
+                           filename: Optional[str] = None) -> Dict[str, Any]:
+    """Analyze a clothing image given as a file path or as raw bytes.
+    
+    ``filename`` is used as context when the image is passed as bytes.
+    """
+    return analyze_clothing_images([(image, user_description, filename)])[0]
+
+
+def analyze_clothing_images(images: List[Tuple[Union[str, bytes], str, Optional[str]]],
+                            return_exceptions: bool = False) -> List[Any]:
+    """Analyze several images.
+    
+    Each entry is ``(image, user_description, filename)`` as for
+    analyze_clothing_image; results come back in the same order. With
+    ``return_exceptions=True`` an image that fails yields its exception
+    in place of a result instead of failing the whole batch.
+    """
+    results = []
+    for image, desc, filename in images:
+        try:
+            key = _result_cache_key(image, desc, filename)
+            result = _result_cache_get(key)
+            if result is None:
+                result = _analyze(image, desc, filename)
+                _result_cache_put(key, result)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            result = e
+        results.append(result)
+    return results
 
 
 # ==========================
-# GENERATIVE ANALYSIS (LLM = helper, not judge)
+# Result cache (re-uploads of the same image skip decoding)
 # ==========================
-def analyze_clothing_image(image_path: str, user_description: str) -> Dict[str, Any]:
-    filename = os.path.basename(image_path).lower()
+_RESULT_CACHE_SIZE = 4096
+_result_cache: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+
+def _context_filename(image: Union[str, bytes], filename: Optional[str]) -> str:
+    """The lower-cased file name _analyze reads category hints from."""
+    if filename is None:
+        filename = image if isinstance(image, str) else ""
+    return os.path.basename(filename).lower()
+
+
+def _result_cache_key(image: Union[str, bytes], user_description: str,
+                      filename: Optional[str] = None) -> Optional[Tuple[str, str, str]]:
+    """Key results by image content, description and the category the file name implies.
+    
+    The file name only feeds category inference in _analyze, and upload
+    names carry a unique prefix, so the inferred category is keyed rather
+    than the name itself. None if the image can't be read.
+    """
+    context = f"{_context_filename(image, filename)} {user_description or ''}"
+    name_category = _infer_category_from_context(context) or ""
+    try:
+        if isinstance(image, str):
+            with open(image, "rb") as f:
+                image = f.read()
+    except OSError:
+        return None
+    return hashlib.blake2b(image, digest_size=16).hexdigest(), name_category, user_description or ""
+
+
+def _result_cache_get(key: Optional[Tuple[str, str, str]]) -> Optional[Dict[str, Any]]:
+    if key is None:
+        return None
+    with _result_cache_lock:
+        result = _result_cache.get(key)
+        if result is None:
+            return None
+        _result_cache.move_to_end(key)
+    return copy.deepcopy(result)
+
+
+def _result_cache_put(key: Optional[Tuple[str, str, str]], result: Dict[str, Any]) -> None:
+    if key is None:
+        return
+    with _result_cache_lock:
+        _result_cache[key] = copy.deepcopy(result)
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > _RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+
+def _analyze(image: Union[str, bytes], user_description: str,
+             filename: Optional[str]) -> Dict[str, Any]:
+    """Category, season, formality and tags from the filename, description and colour."""
+    filename = _context_filename(image, filename)
     desc = user_description or ""
-    color = _dominant_color(image_path)
+    color = _dominant_color(image)
 
     # 1) Deterministic category first (MOST IMPORTANT)
     context = f"{filename} {desc}"
     forced_category = _infer_category_from_context(context)
-
-    # 2) Use the generative model to enrich: tags / season / formality
-    # Keep prompt short to avoid nonsense.
-    prompt = (
-        "Extract fashion attributes from the input.\n"
-        f"Description: {desc}\n"
-        f"Filename: {filename}\n"
-        f"Color: {color}\n"
-        "Return a short text mentioning: category, season, formality, and a few style tags.\n"
-        "Be concise.\n"
-    )
-    llm_text = generator(prompt)[0]["generated_text"]
-    llm_text_norm = _normalize_text(llm_text)
-
-    # 3) Category: forced category wins; otherwise try from LLM; otherwise fallback
-    category = forced_category
-
-    if category is None:
-        # parse from LLM text with priority order
-        category = _infer_category_from_context(llm_text_norm)
-
-    if category is None:
-        category = "shirt"
+    category = forced_category or "shirt"
 
     # normalize category variants (just in case)
     category = CATEGORY_MAP.get(category, category)
     if category not in VALID_CATEGORIES:
         category = "shirt"
 
-    # 4) Season & formality: combine LLM + user text (stable)
-    season = _infer_season_from_text(desc + " " + llm_text_norm)
+    # 2) Season, formality & style tags: one pass over the user text (stable)
+    found = _text_attributes(desc)
+
+    season = _first_label(found["season"], SEASON_PRIORITY, "all-season")
     if season not in VALID_SEASONS:
         season = "all-season"
 
-    formality = _infer_formality_from_text(desc + " " + llm_text_norm)
+    formality = _first_label(found["formality"], FORMALITY_PRIORITY, "casual")
     if formality not in VALID_FORMALITY:
         formality = "casual"
 
-    # 5) Style tags: pull from both description and LLM output
-    tags = []
-    merged = _normalize_text(desc + " " + llm_text_norm)
-    for t in STYLE_TAGS:
-        if t in merged and t not in tags:
-            tags.append(t)
-
-    # small derived tags
-    if category in ["jacket", "sweater"] and "cozy" not in tags:
-        tags.append("cozy")
-    if category == "shoes" and "footwear" not in tags:
-        tags.append("footwear")
+    # 3) Style tags: description first, then category / colour defaults
+    tags = [t for t in STYLE_TAGS if t in found["tag"]]
+    for tag in CATEGORY_DEFAULT_TAGS.get(category, []) + COLOR_DEFAULT_TAGS.get(color, []):
+        if tag not in tags:
+            tags.append(tag)
 
     return {
         "category": category,
@@ -199,27 +307,46 @@ def analyze_clothing_image(image_path: str, user_description: str) -> Dict[str,
         "season": season,
         "formality": formality,
         "confidence": 0.90 if forced_category else 0.78,
-        "note": "Hybrid: deterministic category + local generative enrichment (distilgpt2)."
+        "note": "Deterministic: category from filename/description, tags from keyword rules."
     }
 
-def _dominant_color(image_path: str) -> str:
+
+def _decode_small_rgb(image: Union[str, bytes]) -> np.ndarray:
+    """Decode an image at reduced size as an (N, 3) array of RGB pixels.
+    
+    The mean colour survives heavy downsampling, so OpenCV downscales
+    during decoding (1/8 size) when available; PIL is used otherwise and
+    for formats OpenCV can't read (e.g. GIF).
+    """
+    if cv2 is not None:
+        if isinstance(image, bytes):
+            bgr = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_8)
+        else:
+            bgr = cv2.imread(image, cv2.IMREAD_REDUCED_COLOR_8)
+        if bgr is not None:
+            return bgr.reshape(-1, 3)[:, ::-1]
+    
+    with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as img:
+        # JPEGs are decoded straight to RGB at 1/2-1/8 scale (no-op for other formats)
+        img.draft("RGB", (32, 32))
+        img.thumbnail((32, 32))
+        return np.asarray(img.convert("RGB"), dtype=np.uint8).reshape(-1, 3)
+
+
+def _dominant_color(image: Union[str, bytes]) -> str:
     """Returns a robust coarse color name using average RGB + simple heuristics."""
     try:
         # Check if file exists first
-        if not os.path.exists(image_path):
-            print(f"⚠️ Warning: Image file not found: {image_path}")
+        if isinstance(image, str) and not os.path.exists(image):
+            logger.warning("⚠️ Warning: Image file not found: %s", image)
             return "unknown"
         
-        img = Image.open(image_path).convert("RGB").resize((80, 80))
-        pixels = list(img.getdata())
-        
-        if not pixels:
+        pixels = _decode_small_rgb(image)
+        if not len(pixels):
             return "unknown"
         
         # Average RGB
-        avg_r = sum(p[0] for p in pixels) // len(pixels)
-        avg_g = sum(p[1] for p in pixels) // len(pixels)
-        avg_b = sum(p[2] for p in pixels) // len(pixels)
+        avg_r, avg_g, avg_b = (int(c) for c in pixels.mean(axis=0))
         
         # Map to color names (simplified)
         if avg_r > 200 and avg_g > 200 and avg_b > 200:
@@ -247,5 +374,5 @@ def _dominant_color(image_path: str) -> str:
             return "beige"  # default fallback
             
     except Exception as e:
-        print(f"⚠️ Color detection error: {e}")
+        logger.warning("⚠️ Color detection error: %s", e)
         return "unknown"  # Always return string, never None
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""Gunicorn settings for running the SmartStylist API in production.
+
+Run:
+    gunicorn -c gunicorn.conf.py api:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8080")
+
+# Worker processes give real parallelism for the CPU-bound analysis path;
+# threads keep each worker responsive while it waits on MongoDB or weather calls.
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Each worker imports the app itself: the MongoDB client and the background
+# threads (analysis worker, GridFS uploader, log listener) must not be forked.
+preload_app = False
+
+# Asynchronous /analyze jobs need REDIS_URL when there is more than one
+# worker: the job is then stored in Redis, so any worker can answer
+# /analyze/<job_id>. Without it an in-process job could only be polled on
+# the worker that accepted it, so the API (told the worker count through
+# API_WORKERS) handles ?async=1 requests synchronously instead.
+os.environ.setdefault("API_WORKERS", str(workers))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+accesslog = "-"
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import os
-from dotenv import load_dotenv
+from config import load_env, configure_logging
 
-load_dotenv()
+load_env()
+configure_logging()
 
 from clothing_item import ClothingItem
 from gemini_analyzer import analyze_clothing_image
+from mongodb_client import db_client
 from wardrobe_database import WardrobeDatabase
 from outfit_generator import OutfitGenerator
 
@@ -14,7 +16,8 @@ from outfit_generator import OutfitGenerator
 wardrobe_db = WardrobeDatabase(vector_dir=os.getenv("VECTOR_DIR", "./wardrobe_db"))
 outfit_gen = OutfitGenerator(wardrobe_db)
 
-def add_clothing_to_wardrobe(image_path: str, user_description: str, user_id: str = "anonymous") -> dict:
+def add_clothing_to_wardrobe(image_path: str, user_description: str, user_id: str = "anonymous",
+                             category: str = None) -> dict:
     """Analyze + store item (MongoDB mandatory) and return stored document info."""
     analysis = analyze_clothing_image(image_path, user_description)
     
@@ -23,6 +26,7 @@ def add_clothing_to_wardrobe(image_path: str, user_description: str, user_id: st
         image_path=image_path,
         description=user_description,
         user_id=user_id,
+        category=category,
         analysis=analysis
     )
 
@@ -30,3 +34,24 @@ def add_clothing_to_wardrobe(image_path: str, user_description: str, user_id: st
         "item_id": item_id,
         "analysis": analysis
     }
+
+
+def analyze_upload_task(image_path: str, user_description: str, user_id: str = "anonymous",
+                        category: str = None) -> dict:
+    """Task-queue entry point for asynchronous /analyze jobs (run by `rq worker analyze`).
+    
+    Queued GridFS uploads and local store writes are flushed before
+    returning, since RQ work horses exit without running atexit hooks.
+    The upload is removed if the job fails.
+    """
+    try:
+        result = add_clothing_to_wardrobe(image_path, user_description, user_id, category)
+    except Exception:
+        try:
+            os.remove(image_path)
+        except OSError:
+            pass
+        raise
+    db_client.flush_pending_images()
+    db_client.flush()
+    return result
@@ -0,0 +1,51 @@
+"""One-time backfill of wardrobe item defaults.
+
+New items are normalized when they are stored; this brings documents
+written before that change in line (normalized category, color,
+style_tags, formality and season).
+
+Run:
+    python migrate_items.py
+"""
+
+from config import load_env
+load_env()
+
+from bson import ObjectId
+
+from mongodb_client import db_client
+from wardrobe_database import WardrobeDatabase
+
+FIELDS = ("category", "color", "style_tags", "formality", "season")
+
+
+def main():
+    wardrobe_db = WardrobeDatabase()
+
+    if db_client._mode == "local":
+        data = db_client._load_local()
+        items = data.get("wardrobe_items", [])
+        for item in items:
+            wardrobe_db._normalize_item(item)
+            db_client._local_touch("wardrobe_items", item.get("_id"))
+        # Per-user counters are rebuilt from the normalized items on next read
+        data.pop("user_counters", None)
+        db_client._save_local(data)
+        print(f"✅ Normalized {len(items)} local items")
+        return
+
+    coll = db_client._wardrobe_coll
+    updated = 0
+    for doc in coll.find({}, {field: 1 for field in FIELDS}):
+        fixed = wardrobe_db._normalize_item(dict(doc))
+        changes = {field: fixed[field] for field in FIELDS if doc.get(field) != fixed[field]}
+        if changes:
+            coll.update_one({"_id": ObjectId(doc["_id"])}, {"$set": changes})
+            updated += 1
+    # Category counters are rebuilt from the normalized items on next read
+    db_client._counters_coll.delete_many({})
+    print(f"✅ Normalized {updated} items")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,173 @@ from __future__ import annotations
 import os
 import io
 import base64
+import copy
 import json
+import mmap
 import uuid
-from typing import Any, Dict, List, Optional, Tuple
-from datetime import datetime
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
 
-from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 import gridfs
 
-from config import MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION
+try:
+    import pybase64  # SIMD base64, much faster on full-size images
+except ImportError:
+    pybase64 = None
+
+try:
+    import orjson  # several times faster than the stdlib codec for the local store
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl  # serializes local store flushes across processes (POSIX only)
+except ImportError:
+    fcntl = None
+
+from config import load_env, MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+
+def _json_dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _utcnow() -> datetime:
+    """Current UTC time as a naive datetime, the form stored so far (utcnow() is deprecated)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _id_key(doc_id: Any) -> str:
+    """Local store ids are uuid hex strings already; only convert anything else."""
+    return doc_id if isinstance(doc_id, str) else str(doc_id)
+
+
+def _history_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of an outfit item stored in outfit history."""
+    get = item.get
+    return {
+        "item_id": get("id"),
+        "image_file_id": get("image_file_id"),
+        "category": get("category"),
+        "color": get("color"),
+        "style_tags": get("style_tags", []),
+    }
+
+
+def _is_favorite(outfit: Dict[str, Any]) -> bool:
+    metadata = outfit.get("metadata")
+    tags = metadata.get("tags") if metadata else None
+    return bool(tags) and "favorite" in tags
+
+
+def _category_key(doc: Dict[str, Any]) -> Any:
+    """Category a doc is counted under; matches the $ifNull in count_by_category's $group."""
+    category = doc.get("category")
+    return "unknown" if category is None else category
+
+
+def _counter_key_ok(category: Any) -> bool:
+    """Whether a category can be used as a field name in the counters document."""
+    return isinstance(category, str) and bool(category) and "." not in category and not category.startswith("$")
+
+
+def _facet_count(facet: Optional[List[Dict[str, Any]]]) -> int:
+    """Value of a ``{"$count": "n"}`` $facet stage (an empty list when nothing matched)."""
+    return facet[0]["n"] if facet else 0
+
+
+# $facet branches for the user overview and the outfit statistics, each fed
+# only the fields it reads (full documents would be buffered and unwound)
+_WARDROBE_FACET_FIELDS = {"_id": 0, "category": 1, "formality": 1}
+_HISTORY_FACET_FIELDS = {"_id": 0, "items.item_id": 1, "metadata.tags": 1}
+_WARDROBE_FACETS = {
+    # Missing categories count as "unknown", as in count_by_category and the local store
+    "by_category": [{"$group": {"_id": {"$ifNull": ["$category", "unknown"]}, "count": {"$sum": 1}}}],
+    "by_formality": [{"$group": {"_id": "$formality", "count": {"$sum": 1}}}],
+    "total": [{"$count": "n"}],
+}
+_HISTORY_FACETS = {
+    "total": [{"$count": "n"}],
+    "favorites": [{"$match": {"metadata.tags": "favorite"}}, {"$count": "n"}],
+    "most_used": [
+        {"$unwind": "$items"},
+        {"$group": {"_id": "$items.item_id", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 5}
+    ],
+}
+
+
+def _overview_from_facets(facets: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "total_items": _facet_count(facets.get("total")),
+        "by_category": {d["_id"]: d["count"] for d in facets.get("by_category", [])},
+        "by_formality": {d["_id"]: d["count"] for d in facets.get("by_formality", [])},
+    }
+
+
+def _b64encode(data: bytes) -> bytes:
+    return pybase64.b64encode(data) if pybase64 is not None else base64.b64encode(data)
+
+
+# List views link images through the API (GET /images/<file_id>) instead of inlining them
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8080").rstrip("/")
+
+
+def image_file_url(file_id: str, thumb: bool = False) -> str:
+    """Public URL of a stored image (or its item's thumbnail), served raw by the API."""
+    url = f"{PUBLIC_BASE_URL}/images/{file_id}"
+    return f"{url}?thumb=1" if thumb else url
+
+
+# Partial index over favorited outfits (see _create_indexes)
+FAVORITES_INDEX = "fav_by_user"
+
+# GridFS chunks fetched per round trip and image (16 chunks covers ~4-8 MB photos)
+GRIDFS_CHUNK_BATCH = 16
+
+# Read size for streamed base64: one default GridFS chunk (255 KiB, half of
+# gridfs_chunk_size), which is also a multiple of 3 so encoded pieces
+# concatenate cleanly
+B64_READ_CHUNK = 255 * 1024
+
+
+def _b64encode_stream(f) -> str:
+    """Base64-encode a file object chunk by chunk, without reading it whole first."""
+    out = bytearray()
+    carry = b""
+    while True:
+        chunk = f.read(B64_READ_CHUNK)
+        if not chunk:
+            break
+        chunk = carry + chunk
+        cut = len(chunk) - len(chunk) % 3
+        out += _b64encode(chunk[:cut])
+        carry = chunk[cut:]
+    out += _b64encode(carry)
+    return out.decode("ascii")
 
-load_dotenv()
 
 @dataclass
 class DatabaseConfig:
@@ -26,7 +179,29 @@ class DatabaseConfig:
     wardrobe_collection: str = os.getenv("MONGODB_COLLECTION", MONGODB_COLLECTION)
     outfit_history_collection: str = "outfit_history"
     users_collection: str = "users"
+    # Per-user item counts by category, kept up to date on insert/delete
+    counters_collection: str = "user_counters"
     images_bucket: str = "images"
+    # Connection pool sized for a multi-worker deployment
+    max_pool_size: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "200"))
+    min_pool_size: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "20"))
+    wait_queue_timeout_ms: int = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+    socket_timeout_ms: int = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "20000"))
+    # Wire compression, in order of preference (MongoDB 4.2+ servers accept
+    # zstd and zlib unless --networkMessageCompressors says otherwise)
+    compressors: str = os.getenv("MONGODB_COMPRESSORS", "zstd,zlib")
+    # Deferred GridFS uploads are committed every interval, or sooner once a batch fills up
+    image_upload_interval: float = float(os.getenv("IMAGE_UPLOAD_INTERVAL", "10"))
+    image_upload_batch_size: int = int(os.getenv("IMAGE_UPLOAD_BATCH_SIZE", "32"))
+    # Chunk size for new GridFS files: most wardrobe photos fit in one or two chunks
+    gridfs_chunk_size: int = int(os.getenv("GRIDFS_CHUNK_KB", "510")) * 1024
+    # Memory budget for base64-encoded images kept by get_image_base64
+    image_cache_bytes: int = int(os.getenv("IMAGE_CACHE_MB", "64")) * 1024 * 1024
+    # get_user_statistics results are reused for this long unless the user writes
+    stats_cache_ttl: float = float(os.getenv("STATS_CACHE_TTL", "30"))
+    stats_cache_size: int = int(os.getenv("STATS_CACHE_SIZE", "1024"))
+    # Local JSON store writes are coalesced and flushed this long after the last change
+    local_flush_interval_ms: int = int(os.getenv("LOCAL_FLUSH_INTERVAL_MS", "200"))
 
 
 class MongoDBClient:
@@ -35,45 +210,112 @@ class MongoDBClient:
     _client = None
     _db = None
     _fs = None
+    _bucket = None
     _mode = "mongo"  # "mongo" or "local"
     _local_path = None
     
+    # Fields list views never return; get_clothing_item still has the full doc
+    LIST_EXCLUDED_FIELDS = ("analysis",)
+    # Outfit history fields shown by history/favorites listings
+    HISTORY_LIST_FIELDS = ("title", "details", "items", "occasion", "weather", "generated_at",
+                           "user_feedback", "metadata.tags", "metadata.outfit_score")
+    
+    _instance_lock = threading.Lock()
+    
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(MongoDBClient, cls).__new__(cls)
-            cls._instance._init_client()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super(MongoDBClient, cls).__new__(cls)
+                    instance._init_client()
+                    cls._instance = instance
         return cls._instance
     
     def _init_client(self):
         """Initialize MongoDB connection (preferred) or fall back to a local JSON store."""
         config = DatabaseConfig()
         self._config = config
+        
+        # Images waiting for the background uploader: file_id -> (path, metadata)
+        self._pending_images: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._pending_lock = threading.Lock()
+        # Reads of individual image files for a page run concurrently
+        self._io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="image-io")
+
+        # Recently served images as base64, least recently used first
+        self._image_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._image_cache_bytes = 0
+        self._image_cache_lock = threading.Lock()
+
+        # Per-user statistics: user_id -> (expires_at, stats), oldest first
+        self._stats_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._stats_cache_lock = threading.Lock()
+        self._stats_cache_hits = 0
+        self._stats_cache_misses = 0
 
         # Local fallback DB file (in project folder)
         self._local_path = os.getenv("LOCAL_DB_PATH") or os.path.join(
             os.path.dirname(__file__), "local_db.json"
         )
+        # Local store is parsed once and served from memory; _save_local writes it back
+        self._local_cache: Optional[Dict[str, Any]] = None
+        self._local_stamp: Optional[Tuple[int, int, int]] = None
+        self._local_dirty = False
+        self._local_lock = threading.RLock()
+        self._local_index: Optional[Dict[str, Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]]] = None
+        self._local_flush_timer: Optional[threading.Timer] = None
+        self._suspend_flush = 0
+        # Ids of local docs written since the last flush, per collection, so
+        # they can be merged into a file another process rewrote meanwhile
+        self._local_changes: Dict[str, set] = defaultdict(set)
+        # Set by _create_indexes once the partial favorites index is in place
+        self._favorites_index = False
 
         try:
             # Fast fail if MongoDB isn't reachable
-            self._client = MongoClient(config.uri, serverSelectionTimeoutMS=1500)
+            self._client = MongoClient(
+                config.uri,
+                serverSelectionTimeoutMS=1500,
+                maxPoolSize=config.max_pool_size,
+                minPoolSize=config.min_pool_size,
+                waitQueueTimeoutMS=config.wait_queue_timeout_ms,
+                socketTimeoutMS=config.socket_timeout_ms,
+                compressors=config.compressors,
+                retryWrites=True,
+                retryReads=True,
+            )
             self._client.admin.command("ping")
             self._db = self._client[config.db_name]
+            # Collection handles, built once instead of on every call
+            self._wardrobe_coll = self._db[config.wardrobe_collection]
+            self._history_coll = self._db[config.outfit_history_collection]
+            self._users_coll = self._db[config.users_collection]
+            self._counters_coll = self._db[config.counters_collection]
+            self._files_coll = self._db["fs.files"]
+            self._chunks_coll = self._db["fs.chunks"]
             self._fs = gridfs.GridFS(self._db)
+            # Reads go through the bucket API (same default "fs" bucket as _fs)
+            self._bucket = gridfs.GridFSBucket(self._db)
             self._mode = "mongo"
-            print(f"✅ Connected to MongoDB: {config.db_name}")
+            logger.info("✅ Connected to MongoDB: %s", config.db_name)
 
-            # Create indexes
-            self._create_indexes()
+            # Create indexes (a failure here leaves queries slower, not broken)
+            try:
+                self._create_indexes()
+            except Exception as e:
+                logger.warning("⚠️ Could not create MongoDB indexes: %s", e)
+            self._start_image_uploader()
         except Exception as e:
             # Fallback mode: use a JSON file on disk.
-            print(f"⚠️ MongoDB connection failed, using local fallback: {e}")
+            logger.warning("⚠️ MongoDB connection failed, using local fallback: %s", e)
             self._client = None
             self._db = None
             self._fs = None
+            self._bucket = None
             self._mode = "local"
             self._ensure_local_db()
-            print("✅ Using local fallback storage")
+            atexit.register(self.flush)
+            logger.info("✅ Using local fallback storage")
 
     # ==================== LOCAL FALLBACK STORE ====================
 
@@ -87,19 +329,294 @@ class MongoDBClient:
                 json.dump({"wardrobe_items": [], "outfit_history": []}, f)
 
     def _load_local(self) -> Dict[str, Any]:
-        """Load data from local JSON file."""
-        self._ensure_local_db()
+        """Return the in-memory local store, reading the JSON file only when it changed.
+        
+        The file is re-read if another process rewrote it since it was
+        loaded, so a single stat() is all most calls cost.
+        """
+        with self._local_lock:
+            try:
+                stamp = self._stat_local()
+            except FileNotFoundError:
+                self._ensure_local_db()
+                stamp = self._stat_local()
+            if self._local_cache is None or (stamp != self._local_stamp and not self._local_dirty):
+                self._local_cache = self._read_local()
+                self._local_stamp = stamp
+                self._local_index = None
+            return self._local_cache
+
+    def _stat_local(self) -> Optional[Tuple[int, int, int]]:
+        """Identify the current version of the local file (raises FileNotFoundError if missing).
+        
+        Every flush swaps in a new file, so the inode changes even when two
+        writes land within the same mtime tick.
+        """
         try:
-            with open(self._local_path, "r", encoding="utf-8") as f:
-                return json.load(f) or {"wardrobe_items": [], "outfit_history": []}
+            st = os.stat(self._local_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read_local(self) -> Dict[str, Any]:
+        """Parse the local JSON file (orjson reads it straight from a memory map)."""
+        try:
+            with open(self._local_path, "rb") as f:
+                if orjson is not None and os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf, memoryview(buf) as view:
+                        data = orjson.loads(view)
+                else:
+                    data = _json_loads(f.read())
+            return data or {"wardrobe_items": [], "outfit_history": []}
         except Exception:
             return {"wardrobe_items": [], "outfit_history": []}
 
     def _save_local(self, data: Dict[str, Any]) -> None:
-        """Save data to local JSON file."""
-        self._ensure_local_db()
-        with open(self._local_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Make ``data`` the local store and schedule a write to disk.
+        
+        Writes are debounced by ``local_flush_interval_ms`` so a burst of
+        changes is written once; inside ``buffered()`` they wait for the
+        block to end.
+        """
+        with self._local_lock:
+            if data is not self._local_cache:
+                self._local_index = None
+            self._local_cache = data
+            self._local_dirty = True
+            if self._suspend_flush:
+                return
+            interval = self._config.local_flush_interval_ms / 1000
+            if interval <= 0:
+                self._flush_local()
+                return
+            if self._local_flush_timer is not None:
+                self._local_flush_timer.cancel()
+            self._local_flush_timer = threading.Timer(interval, self._flush_local)
+            self._local_flush_timer.daemon = True
+            self._local_flush_timer.start()
+
+    def flush(self, durable: bool = False) -> None:
+        """Write pending local store changes to disk now (fsync'd if ``durable``)."""
+        with self._local_lock:
+            if self._local_flush_timer is not None:
+                self._local_flush_timer.cancel()
+                self._local_flush_timer = None
+            self._flush_local(durable)
+
+    @contextmanager
+    def buffered(self):
+        """Hold local store writes until the block exits, then write once."""
+        with self._local_lock:
+            self._suspend_flush += 1
+        try:
+            yield self
+        finally:
+            with self._local_lock:
+                self._suspend_flush -= 1
+                if not self._suspend_flush:
+                    self.flush()
+
+    def _flush_local(self, durable: bool = False) -> None:
+        """Write the in-memory local store to disk if it has unsaved changes.
+        
+        If another process rewrote the file since it was loaded, this
+        process's changes are merged into that version rather than
+        overwriting it; the file lock keeps two flushes from interleaving.
+        The store is serialized up front, written to a temp file in one go
+        and swapped in with os.replace, so readers never see a partial
+        file. fsync is skipped unless ``durable`` is set.
+        """
+        with self._local_lock:
+            if not self._local_dirty:
+                return
+            self._ensure_local_db()
+            with self._local_file_lock():
+                try:
+                    stamp = self._stat_local()
+                except FileNotFoundError:
+                    stamp = None
+                if stamp is not None and stamp != self._local_stamp:
+                    self._local_cache = self._merge_local(self._read_local())
+                    self._local_index = None
+                buf = _json_dumps(self._local_cache)
+                tmp = f"{self._local_path}.{os.getpid()}.tmp"
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    view = memoryview(buf)
+                    while view:
+                        view = view[os.write(fd, view):]
+                    if durable:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+                os.replace(tmp, self._local_path)
+                self._local_stamp = self._stat_local()
+            self._local_dirty = False
+            self._local_changes.clear()
+    
+    @contextmanager
+    def _local_file_lock(self):
+        """Exclusive lock on the local store file, held across a read-merge-write."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self._local_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def _merge_local(self, theirs: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply the docs this process wrote since its last flush to a newer copy of the store."""
+        for collection, doc_ids in self._local_changes.items():
+            ours = self._local_indexes(collection)[0]
+            docs = {_id_key(doc.get("_id")): doc for doc in theirs.get(collection, [])}
+            for doc_id in doc_ids:
+                if doc_id in ours:
+                    docs[doc_id] = ours[doc_id]
+                else:
+                    docs.pop(doc_id, None)
+            theirs[collection] = list(docs.values())
+        # Counters are rebuilt from the merged documents on next read
+        theirs.pop("user_counters", None)
+        return theirs
+    
+    def _local_touch(self, collection: str, doc_id: Any) -> None:
+        """Record that a local doc was written, for _merge_local."""
+        with self._local_lock:
+            self._local_changes[collection].add(_id_key(doc_id))
+    
+    def _local_indexes(self, collection: str) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]], Dict[str, Any]]:
+        """``(_id -> doc, user_id -> docs, image_file_id -> doc)`` for a local collection.
+        
+        Built once per load of the store and kept in step by
+        _local_insert / _local_remove, so lookups don't scan the list.
+        """
+        with self._local_lock:
+            data = self._load_local()
+            if self._local_index is None:
+                self._local_index = {}
+            if collection not in self._local_index:
+                by_id: Dict[str, Any] = {}
+                by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+                by_image: Dict[str, Any] = {}
+                for doc in data.get(collection, []):
+                    by_id[_id_key(doc.get("_id"))] = doc
+                    by_user[doc.get("user_id")].append(doc)
+                    if doc.get("image_file_id"):
+                        by_image[doc["image_file_id"]] = doc
+                self._local_index[collection] = (by_id, by_user, by_image)
+            return self._local_index[collection]
+
+    def _local_find(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self._local_indexes(collection)[0].get(_id_key(doc_id))
+
+    def _local_user_docs(self, collection: str, user_id: str) -> List[Dict[str, Any]]:
+        return list(self._local_indexes(collection)[1].get(user_id, ()))
+
+    def _local_find_by_image(self, file_id: str) -> Optional[Dict[str, Any]]:
+        return self._local_indexes("wardrobe_items")[2].get(file_id)
+
+    def _local_insert(self, data: Dict[str, Any], collection: str, doc: Dict[str, Any]) -> None:
+        with self._local_lock:
+            by_id, by_user, by_image = self._local_indexes(collection)
+            data.setdefault(collection, []).append(doc)
+            self._local_touch(collection, doc["_id"])
+            by_id[_id_key(doc["_id"])] = doc
+            by_user[doc.get("user_id")].append(doc)
+            if doc.get("image_file_id"):
+                by_image[doc["image_file_id"]] = doc
+            self._local_count(data, collection, doc, 1)
+
+    def _local_remove(self, data: Dict[str, Any], collection: str, doc_id: str) -> bool:
+        with self._local_lock:
+            by_id, by_user, by_image = self._local_indexes(collection)
+            doc = by_id.pop(_id_key(doc_id), None)
+            if doc is None:
+                return False
+            self._local_touch(collection, doc_id)
+            if by_image.get(doc.get("image_file_id")) is doc:
+                del by_image[doc["image_file_id"]]
+            data[collection] = [d for d in data.get(collection, []) if d is not doc]
+            by_user[doc.get("user_id")] = [d for d in by_user[doc.get("user_id")] if d is not doc]
+            self._local_count(data, collection, doc, -1)
+            return True
+
+    def _local_counters(self, user_id: str) -> Dict[str, Any]:
+        """Per-user totals kept in the store's ``user_counters`` section.
+        
+        Seeded from the user's documents on first read and then adjusted
+        by _local_insert / _local_remove, so stats don't rescan them.
+        """
+        with self._local_lock:
+            data = self._load_local()
+            entry = data.get("user_counters", {}).get(user_id)
+            if entry is not None:
+                return entry
+            items = self._local_indexes("wardrobe_items")[1].get(user_id, ())
+            outfits = self._local_indexes("outfit_history")[1].get(user_id, ())
+            entry = {
+                "wardrobe_total": len(items),
+                "by_category": dict(Counter(_category_key(item) for item in items)),
+                "by_formality": dict(Counter(item.get("formality", "casual") for item in items)),
+                "outfit_total": len(outfits),
+                "favorites": sum(map(_is_favorite, outfits)),
+            }
+            # Only string keys survive a round trip through the JSON file
+            keys = [user_id, *entry["by_category"], *entry["by_formality"]]
+            if all(isinstance(key, str) for key in keys):
+                data.setdefault("user_counters", {})[user_id] = entry
+            return entry
+
+    def _local_count(self, data: Dict[str, Any], collection: str, doc: Dict[str, Any], delta: int) -> None:
+        """Apply +/-1 for an inserted or removed doc to its owner's counters, if seeded."""
+        counters = data.get("user_counters", {})
+        entry = counters.get(doc.get("user_id"))
+        if entry is None:
+            return
+        if collection == "wardrobe_items":
+            category, formality = _category_key(doc), doc.get("formality", "casual")
+            if not (isinstance(category, str) and isinstance(formality, str)):
+                counters.pop(doc.get("user_id"))
+                return
+            entry["wardrobe_total"] += delta
+            for field, key in (("by_category", category), ("by_formality", formality)):
+                n = entry[field].get(key, 0) + delta
+                if n > 0:
+                    entry[field][key] = n
+                else:
+                    entry[field].pop(key, None)
+        elif collection == "outfit_history":
+            entry["outfit_total"] += delta
+            if _is_favorite(doc):
+                entry["favorites"] += delta
+
+    def _local_drop_counters(self, data: Dict[str, Any], *user_ids: Optional[str]) -> None:
+        counters = data.get("user_counters", {})
+        for user_id in user_ids:
+            counters.pop(user_id, None)
+
+    def _list_projection(self, include_images: bool = True) -> Dict[str, int]:
+        """Projection for list queries that leaves out fields list views don't use."""
+        projection = {field: 0 for field in self.LIST_EXCLUDED_FIELDS}
+        if not include_images:
+            projection["thumb_b64"] = 0
+        return projection
+    
+    @staticmethod
+    def _local_list_doc(doc: Dict[str, Any], include_images: bool = True) -> Dict[str, Any]:
+        """Copy a local wardrobe doc for list views, exposing its thumbnail as the image."""
+        doc = {k: copy.deepcopy(v) for k, v in doc.items() if k not in MongoDBClient.LIST_EXCLUDED_FIELDS}
+        thumb = doc.pop("thumb_b64", None)
+        if include_images:
+            if thumb:
+                doc["image_base64"] = thumb
+            if doc.get("image_file_id"):
+                doc["image_url"] = image_file_url(doc["image_file_id"])
+        return doc
     
     def _create_indexes(self):
         """Create necessary database indexes."""
@@ -107,19 +624,34 @@ class MongoDBClient:
             return
             
         # Wardrobe items indexes
-        wardrobe_coll = self._db[self._config.wardrobe_collection]
+        wardrobe_coll = self._wardrobe_coll
         wardrobe_coll.create_index("category")
         wardrobe_coll.create_index("style_tags")
         wardrobe_coll.create_index([("user_id", 1), ("created_at", -1)])
+        wardrobe_coll.create_index([("user_id", 1), ("category", 1)])
         wardrobe_coll.create_index([("category", 1), ("formality", 1)])
+        wardrobe_coll.create_index("image_file_id")
+        # Items whose image is still waiting for the deferred GridFS upload
+        wardrobe_coll.create_index("image_pending", sparse=True)
         
         # Outfit history indexes
-        history_coll = self._db[self._config.outfit_history_collection]
+        history_coll = self._history_coll
         history_coll.create_index([("user_id", 1), ("generated_at", -1)])
         history_coll.create_index([("user_id", 1), ("metadata.tags", 1)])
+        # Favorites only, newest first: get_favorite_outfits reads just this subset.
+        # The trailing _id keeps its key pattern distinct from the full index above.
+        try:
+            history_coll.create_index([("user_id", 1), ("generated_at", -1), ("_id", -1)],
+                                      name=FAVORITES_INDEX,
+                                      partialFilterExpression={"metadata.tags": "favorite"})
+            self._favorites_index = True
+        except Exception as e:
+            logger.warning("⚠️ Could not create favorites index: %s", e)
         history_coll.create_index("metadata.tags")
         history_coll.create_index("occasion")
         history_coll.create_index([("items.item_id", 1)])
+        # Per-user most-used items in get_user_statistics
+        history_coll.create_index([("user_id", 1), ("items.item_id", 1)])
     
     # ==================== IMAGE STORAGE (GridFS) ====================
     
@@ -136,14 +668,121 @@ class MongoDBClient:
             with open(image_path, 'rb') as f:
                 metadata = {
                     "filename": os.path.basename(image_path),
-                    "uploaded_at": datetime.utcnow(),
+                    "uploaded_at": _utcnow(),
                     "user_id": user_id
                 }
-                file_id = self._fs.put(f, **metadata)
+                file_id = self._fs.put(f, chunkSize=self._config.gridfs_chunk_size, **metadata)
                 return str(file_id)
         except Exception as e:
             raise Exception(f"Failed to save image to GridFS: {str(e)}")
     
+    def save_image_deferred(self, image_path: str, user_id: Optional[str] = None) -> str:
+        """Reserve a GridFS file_id for an image and upload it in the background.
+        
+        The file must stay at ``image_path`` until it is uploaded. Items
+        saved with a pending image are flagged ``image_pending``, so reads
+        in any process fall back to the item's ``image_path`` meanwhile and
+        uploads lost with their process are picked up again at startup.
+        """
+        if self._mode == "local" or self._fs is None:
+            return self.save_image(image_path, user_id)
+        
+        file_id = str(ObjectId())
+        metadata = {
+            "filename": os.path.basename(image_path),
+            "uploaded_at": _utcnow(),
+            "user_id": user_id
+        }
+        with self._pending_lock:
+            self._pending_images[file_id] = (image_path, metadata)
+            batch_full = len(self._pending_images) >= self._config.image_upload_batch_size
+        if batch_full:
+            self._uploader_wakeup.set()
+        return file_id
+    
+    def _start_image_uploader(self) -> None:
+        """Start the thread that commits deferred images to GridFS."""
+        self._uploader_wakeup = threading.Event()
+        threading.Thread(target=self._image_uploader, name="gridfs-uploader", daemon=True).start()
+        atexit.register(self.flush_pending_images)
+    
+    def _image_uploader(self) -> None:
+        try:
+            self._requeue_pending_images()
+        except Exception as e:
+            logger.warning("⚠️ Could not requeue pending images: %s", e)
+        while True:
+            self._uploader_wakeup.wait(self._config.image_upload_interval)
+            self._uploader_wakeup.clear()
+            self.flush_pending_images()
+    
+    def _requeue_pending_images(self) -> None:
+        """Queue images whose upload was lost with the process that deferred it.
+        
+        Only items older than a few upload intervals are considered, so
+        images another live worker is about to upload are left alone (an
+        image uploaded twice is caught by FileExists anyway).
+        """
+        cutoff = _utcnow() - timedelta(seconds=3 * self._config.image_upload_interval)
+        for doc in self._wardrobe_coll.find(
+            {"image_pending": True, "created_at": {"$lt": cutoff}},
+            {"image_file_id": 1, "image_path": 1, "user_id": 1}
+        ):
+            file_id, image_path = doc.get("image_file_id"), doc.get("image_path")
+            if not file_id or self._fs.exists(ObjectId(file_id)):
+                self._wardrobe_coll.update_one({"_id": doc["_id"]}, {"$unset": {"image_pending": ""}})
+            elif image_path and os.path.exists(image_path):
+                with self._pending_lock:
+                    self._pending_images.setdefault(file_id, (image_path, {
+                        "filename": os.path.basename(image_path),
+                        "uploaded_at": _utcnow(),
+                        "user_id": doc.get("user_id")
+                    }))
+            else:
+                logger.warning("⚠️ Image %s of item %s is missing from %s", file_id, doc["_id"], image_path)
+        if self._pending_images:
+            self._uploader_wakeup.set()
+    
+    def _clear_image_pending(self, file_ids: List[str]) -> None:
+        self._wardrobe_coll.update_many({"image_file_id": {"$in": file_ids}},
+                                        {"$unset": {"image_pending": ""}})
+    
+    def flush_pending_images(self) -> int:
+        """Upload every pending image to GridFS and return how many were stored.
+        
+        An image leaves the queue only once it is in GridFS; failed ones
+        are retried on the next run.
+        """
+        with self._pending_lock:
+            batch = list(self._pending_images.items())
+        
+        stored = []
+        for file_id, (image_path, metadata) in batch:
+            try:
+                with open(image_path, 'rb') as f:
+                    self._fs.put(f, _id=ObjectId(file_id), chunkSize=self._config.gridfs_chunk_size,
+                                 **metadata)
+            except gridfs.errors.FileExists:
+                pass
+            except Exception as e:
+                logger.warning("⚠️ Deferred image upload failed for %s, will retry: %s", file_id, e)
+                continue
+            stored.append(file_id)
+            
+            with self._pending_lock:
+                deleted = self._pending_images.pop(file_id, None) is None
+            if deleted:
+                # The item was removed while its image was being uploaded
+                self.delete_image(file_id)
+        
+        if stored:
+            try:
+                self._clear_image_pending(stored)
+            except Exception as e:
+                # Left flagged: the next startup finds the files in GridFS and clears them
+                logger.warning("⚠️ Could not clear image_pending flags: %s", e)
+        return len(stored)
+    
     def save_image_bytes(self, image_bytes: bytes, filename: str, 
                         user_id: Optional[str] = None) -> str:
         """Save image bytes to GridFS."""
@@ -161,14 +800,20 @@ class MongoDBClient:
             
         metadata = {
             "filename": filename,
-            "uploaded_at": datetime.utcnow(),
+            "uploaded_at": _utcnow(),
             "user_id": user_id
         }
-        file_id = self._fs.put(image_bytes, **metadata)
+        file_id = self._fs.put(image_bytes, chunkSize=self._config.gridfs_chunk_size, **metadata)
         return str(file_id)
     
     def get_image(self, file_id: str) -> Tuple[bytes, Dict[str, Any]]:
         """Retrieve image and metadata from GridFS."""
+        f, metadata = self.open_image(file_id)
+        with f:
+            return f.read(), metadata
+    
+    def open_image(self, file_id: str) -> Tuple[Any, Dict[str, Any]]:
+        """Open an image for reading; returns a file-like object and its metadata."""
         if self._mode == "local":
             # In local mode, file_id is either "local:<name>" or a path.
             name = str(file_id)
@@ -182,30 +827,180 @@ class MongoDBClient:
             for p in candidates:
                 try:
                     if os.path.exists(p):
-                        with open(p, "rb") as f:
-                            return f.read(), {"filename": os.path.basename(p), "uploaded_at": None, "user_id": None}
+                        return open(p, "rb"), {"filename": os.path.basename(p), "uploaded_at": None, "user_id": None}
                 except Exception:
                     continue
             raise Exception("Image not found in local store")
         
         if self._fs is None:  # FIX: Check if fs is not None
             raise Exception("GridFS not initialized")
+        
+        pending = self._pending_images.get(file_id)
+        if pending:
+            image_path, metadata = pending
+            return open(image_path, 'rb'), dict(metadata)
             
         try:
-            file_data = self._fs.get(ObjectId(file_id))
+            file_data = self._bucket.open_download_stream(ObjectId(file_id))
             metadata = {
                 "filename": file_data.filename,
                 "uploaded_at": file_data.upload_date,
                 "user_id": file_data.user_id if hasattr(file_data, 'user_id') else None
             }
-            return file_data.read(), metadata
+            return file_data, metadata
+        except gridfs.errors.NoFile:
+            # Not uploaded yet, possibly by another worker: read the item's file
+            opened = self._open_item_image_path(file_id)
+            if opened is None:
+                raise Exception(f"Failed to retrieve image from GridFS: no file {file_id}")
+            return opened
         except Exception as e:
             raise Exception(f"Failed to retrieve image from GridFS: {str(e)}")
     
+    def _open_item_image_path(self, file_id: str) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """Open the uploaded file of the item that references a not-yet-stored image."""
+        doc = self._wardrobe_coll.find_one({"image_file_id": file_id}, {"image_path": 1, "user_id": 1})
+        image_path = doc.get("image_path") if doc else None
+        if not image_path or not os.path.exists(image_path):
+            return None
+        metadata = {"filename": os.path.basename(image_path), "uploaded_at": None,
+                    "user_id": doc.get("user_id")}
+        return open(image_path, 'rb'), metadata
+    
     def get_image_base64(self, file_id: str) -> str:
         """Get image as base64 string for frontend display."""
-        image_bytes, _ = self.get_image(file_id)
-        return base64.b64encode(image_bytes).decode('utf-8')
+        encoded = self._image_cache_get(file_id)
+        if encoded is None:
+            f, _ = self.open_image(file_id)
+            with f:
+                encoded = _b64encode_stream(f)
+            self._image_cache_put(file_id, encoded)
+        return encoded
+    
+    def _image_cache_get(self, file_id: str) -> Optional[str]:
+        with self._image_cache_lock:
+            encoded = self._image_cache.get(file_id)
+            if encoded is not None:
+                self._image_cache.move_to_end(file_id)
+            return encoded
+    
+    def _image_cache_put(self, file_id: str, encoded: str) -> None:
+        budget = self._config.image_cache_bytes
+        if len(encoded) > budget:
+            return
+        with self._image_cache_lock:
+            old = self._image_cache.pop(file_id, None)
+            if old is not None:
+                self._image_cache_bytes -= len(old)
+            self._image_cache[file_id] = encoded
+            self._image_cache_bytes += len(encoded)
+            while self._image_cache_bytes > budget:
+                _, evicted = self._image_cache.popitem(last=False)
+                self._image_cache_bytes -= len(evicted)
+    
+    def _image_cache_discard(self, file_id: str) -> None:
+        with self._image_cache_lock:
+            old = self._image_cache.pop(file_id, None)
+            if old is not None:
+                self._image_cache_bytes -= len(old)
+    
+    def get_thumbnail(self, file_id: str) -> Optional[bytes]:
+        """JPEG thumbnail stored on the wardrobe item that owns an image, if any."""
+        if self._mode == "local":
+            doc = self._local_find_by_image(file_id)
+        elif self._db is not None:
+            doc = self._wardrobe_coll.find_one({"image_file_id": file_id}, {"thumb_b64": 1})
+        else:
+            doc = None
+        thumb = doc.get("thumb_b64") if doc else None
+        return base64.b64decode(thumb) if thumb else None
+    
+    def get_images_base64_bulk(self, file_ids: List[str]) -> Dict[str, str]:
+        """Get several images as base64 strings, keyed by file_id.
+
+        In MongoDB mode all chunks are read with a single ``$in`` query on the
+        GridFS chunks collection instead of one lookup per image. Missing or
+        unreadable images are left out of the result.
+        """
+        ids = [fid for fid in dict.fromkeys(file_ids) if fid]
+        if not ids:
+            return {}
+
+        if self._mode == "local":
+            return self._read_images_base64(ids)
+
+        if self._db is None:
+            return {}
+
+        result: Dict[str, str] = {}
+        # Images not uploaded yet are read from their files
+        result.update(self._read_images_base64([fid for fid in ids if fid in self._pending_images]))
+        ids = [fid for fid in ids if fid not in result]
+
+        for fid in ids:
+            encoded = self._image_cache_get(fid)
+            if encoded is not None:
+                result[fid] = encoded
+        ids = [fid for fid in ids if fid not in result]
+
+        for fid, data in self._get_images_bulk(ids).items():
+            result[fid] = _b64encode(data).decode('ascii')
+            self._image_cache_put(fid, result[fid])
+        
+        # Anything not in GridFS yet (deferred by another worker) comes from the item's file
+        result.update(self._read_images_base64([fid for fid in ids if fid not in result]))
+        return result
+
+    def _read_images_base64(self, file_ids: List[str]) -> Dict[str, str]:
+        """get_image_base64 for several files at once, reading them concurrently.
+        
+        Used for images that live in individual files (local mode, pending
+        uploads); unreadable ones are left out.
+        """
+        def read(fid: str) -> Optional[str]:
+            try:
+                return self.get_image_base64(fid)
+            except Exception:
+                return None
+        
+        encoded = self._io_pool.map(read, file_ids) if len(file_ids) > 1 else map(read, file_ids)
+        return {fid: data for fid, data in zip(file_ids, encoded) if data is not None}
+
+    def _get_images_bulk(self, file_ids: List[str]) -> Dict[str, bytearray]:
+        """Raw bytes of several GridFS files, read with one query on the chunks collection.
+        
+        Only files with an fs.files doc are read, and only those whose chunks
+        add up to its length are returned: GridFS writes that doc last, so an
+        upload still in flight (possibly in another worker) is left out
+        rather than returned truncated.
+        """
+        oids = []
+        for fid in file_ids:
+            try:
+                oids.append(ObjectId(fid))
+            except Exception:
+                continue
+        if not oids or self._db is None:
+            return {}
+
+        lengths = {
+            doc["_id"]: doc["length"]
+            for doc in self._files_coll.find({"_id": {"$in": oids}}, {"length": 1})
+        }
+        if not lengths:
+            return {}
+
+        buffers: Dict[Any, bytearray] = {}
+        cursor = self._chunks_coll.find(
+            {"files_id": {"$in": list(lengths)}},
+            {"files_id": 1, "data": 1}
+        ).sort([("files_id", 1), ("n", 1)]).batch_size(GRIDFS_CHUNK_BATCH * len(lengths))
+        for chunk in cursor:
+            buffers.setdefault(chunk["files_id"], bytearray()).extend(chunk["data"])
+        return {
+            str(oid): data for oid, data in buffers.items()
+            if len(data) == lengths[oid]
+        }
     
     def delete_image(self, file_id: str) -> bool:
         """Delete image from GridFS."""
@@ -214,6 +1009,10 @@ class MongoDBClient:
         
         if self._fs is None:  # FIX: Check if fs is not None
             return False
+        
+        with self._pending_lock:
+            self._pending_images.pop(file_id, None)
+        self._image_cache_discard(file_id)
             
         try:
             self._fs.delete(ObjectId(file_id))
@@ -230,44 +1029,111 @@ class MongoDBClient:
             item_id = uuid.uuid4().hex
             doc = dict(doc)
             doc["_id"] = item_id
-            doc["created_at"] = datetime.utcnow().isoformat()
-            doc["updated_at"] = datetime.utcnow().isoformat()
-            data.setdefault("wardrobe_items", []).append(doc)
+            doc["created_at"] = doc["updated_at"] = _utcnow().isoformat()
+            self._local_insert(data, "wardrobe_items", doc)
             self._save_local(data)
+            self.invalidate_stats(doc.get("user_id"))
             return item_id
 
         if self._db is None:  # FIX: Check if db is not None
             raise Exception("Database not initialized")
             
-        doc["created_at"] = datetime.utcnow()
-        doc["updated_at"] = datetime.utcnow()
+        doc["created_at"] = doc["updated_at"] = _utcnow()
+        self._flag_pending_images([doc])
 
-        coll = self._db[self._config.wardrobe_collection]
+        coll = self._wardrobe_coll
         result = coll.insert_one(doc)
+        self._bump_category_counts([doc], 1)
+        self.invalidate_stats(doc.get("user_id"))
         return str(result.inserted_id)
     
+    def save_clothing_items(self, docs: List[Dict[str, Any]]) -> List[str]:
+        """Save several clothing items in one write and return their ids in order."""
+        if not docs:
+            return []
+        
+        now = _utcnow()
+        if self._mode == "local":
+            data = self._load_local()
+            now_iso = now.isoformat()
+            item_ids = []
+            for doc in docs:
+                doc = dict(doc)
+                doc["_id"] = uuid.uuid4().hex
+                doc["created_at"] = doc["updated_at"] = now_iso
+                self._local_insert(data, "wardrobe_items", doc)
+                item_ids.append(doc["_id"])
+            self._save_local(data)
+            self.invalidate_stats(*{doc.get("user_id") for doc in docs})
+            return item_ids
+        
+        if self._db is None:
+            raise Exception("Database not initialized")
+        
+        for doc in docs:
+            doc["created_at"] = doc["updated_at"] = now
+        self._flag_pending_images(docs)
+        
+        coll = self._wardrobe_coll
+        try:
+            result = coll.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            # All or nothing: callers discard the batch's images and uploads on failure
+            coll.delete_many({"_id": {"$in": [doc["_id"] for doc in docs if "_id" in doc]}})
+            self._drop_category_counts({doc.get("user_id") for doc in docs})
+            raise
+        self._bump_category_counts(docs, 1)
+        self.invalidate_stats(*{doc.get("user_id") for doc in docs})
+        return [str(item_id) for item_id in result.inserted_ids]
+    
+    def _flag_pending_images(self, docs: List[Dict[str, Any]]) -> None:
+        """Mark docs whose image is still queued for upload (see save_image_deferred)."""
+        with self._pending_lock:
+            for doc in docs:
+                if doc.get("image_file_id") in self._pending_images:
+                    doc["image_pending"] = True
+    
     def update_clothing_item(self, item_id: str, updates: Dict[str, Any]) -> bool:
         """Update clothing item."""
         if self._mode == "local":
             data = self._load_local()
-            items = data.get("wardrobe_items", [])
-            changed = False
-            for it in items:
-                if str(it.get("_id")) == str(item_id):
-                    it.update(dict(updates))
-                    it["updated_at"] = datetime.utcnow().isoformat()
-                    changed = True
-                    break
-            if changed:
-                self._save_local(data)
-            return changed
+            it = self._local_find("wardrobe_items", item_id)
+            if it is None:
+                return False
+            if any(key in updates and updates[key] != it.get(key) for key in ("user_id", "image_file_id")):
+                self._local_index = None
+            if any(key in updates for key in ("user_id", "category", "formality")):
+                self._local_drop_counters(data, it.get("user_id"), updates.get("user_id"))
+            self.invalidate_stats(it.get("user_id"), updates.get("user_id"))
+            it.update(copy.deepcopy(updates))
+            it["updated_at"] = _utcnow().isoformat()
+            self._local_touch("wardrobe_items", item_id)
+            self._save_local(data)
+            return True
 
         if self._db is None:  # FIX: Check if db is not None
             raise Exception("Database not initialized")
             
-        updates["updated_at"] = datetime.utcnow()
+        updates["updated_at"] = _utcnow()
 
-        coll = self._db[self._config.wardrobe_collection]
+        coll = self._wardrobe_coll
+        if "category" in updates or "user_id" in updates:
+            # Read the old owner/category in the same write, then move the count across
+            old = coll.find_one_and_update(
+                {"_id": ObjectId(item_id)},
+                {"$set": updates},
+                projection={"user_id": 1, "category": 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if old is None:
+                return False
+            new = {"user_id": updates.get("user_id", old.get("user_id")),
+                   "category": updates.get("category", old.get("category"))}
+            if (new["user_id"], _category_key(new)) != (old.get("user_id"), _category_key(old)):
+                self._bump_category_counts([old], -1)
+                self._bump_category_counts([new], 1)
+            self.invalidate_stats(old.get("user_id"), new["user_id"])
+            return True
         result = coll.update_one(
             {"_id": ObjectId(item_id)},
             {"$set": updates}
@@ -277,27 +1143,28 @@ class MongoDBClient:
     def get_clothing_item(self, item_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific clothing item."""
         if self._mode == "local":
-            data = self._load_local()
-            for doc in data.get("wardrobe_items", []):
-                if str(doc.get("_id")) == str(item_id):
-                    # Best-effort image base64 (optional)
-                    if doc.get("image_path") and os.path.exists(doc["image_path"]):
-                        try:
-                            with open(doc["image_path"], "rb") as f:
-                                doc["image_base64"] = base64.b64encode(f.read()).decode("utf-8")
-                        except Exception:
-                            pass
-                    return doc
-            return None
+            doc = self._local_find("wardrobe_items", item_id)
+            if doc is None:
+                return None
+            doc = {k: copy.deepcopy(v) for k, v in doc.items() if k != "thumb_b64"}
+            # Best-effort image base64 (optional)
+            if doc.get("image_path") and os.path.exists(doc["image_path"]):
+                try:
+                    with open(doc["image_path"], "rb") as f:
+                        doc["image_base64"] = _b64encode_stream(f)
+                except Exception:
+                    pass
+            return doc
 
         if self._db is None:  # FIX: Check if db is not None
             return None
             
-        coll = self._db[self._config.wardrobe_collection]
+        coll = self._wardrobe_coll
         doc = coll.find_one({"_id": ObjectId(item_id)})
 
         if doc:
             doc["_id"] = str(doc["_id"])
+            doc.pop("thumb_b64", None)
             if "image_file_id" in doc:
                 try:
                     doc["image_base64"] = self.get_image_base64(doc["image_file_id"])
@@ -310,86 +1177,94 @@ class MongoDBClient:
                                   skip: int = 0) -> List[Dict[str, Any]]:
         """Get clothing items for a specific user."""
         if self._mode == "local":
-            data = self._load_local()
-            items = [it for it in data.get("wardrobe_items", []) if it.get("user_id") == user_id]
-            items = sorted(items, key=lambda d: str(d.get("created_at", "")), reverse=True)
-            return items[skip:skip + limit]
+            items = self._local_user_docs("wardrobe_items", user_id)
+            items = sorted(items, key=lambda d: d.get("created_at") or "", reverse=True)
+            return [self._local_list_doc(it) for it in items[skip:skip + limit]]
 
         if self._db is None:  # FIX: Check if db is not None
             return []
             
-        coll = self._db[self._config.wardrobe_collection]
-        cursor = coll.find({"user_id": user_id}) \
+        coll = self._wardrobe_coll
+        cursor = coll.find({"user_id": user_id}, self._list_projection()) \
                       .sort("created_at", -1) \
                       .skip(skip) \
-                      .limit(limit)
+                      .limit(limit) \
+                      .batch_size(limit)
         
         items = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
+            thumb = doc.pop("thumb_b64", None)
+            if thumb:
+                doc["image_base64"] = thumb
             if "image_file_id" in doc:
-                try:
-                    doc["image_base64"] = self.get_image_base64(doc["image_file_id"])
-                except Exception:
-                    doc["image_base64"] = None
+                doc["image_url"] = image_file_url(doc["image_file_id"])
             items.append(doc)
         
         return items
     
     def list_clothing_items(self, user_id: Optional[str] = None, 
-                           limit: int = 200, skip: int = 0) -> List[Dict[str, Any]]:
-        """List all clothing items, optionally filtered by user."""
+                           limit: int = 200, skip: int = 0,
+                           include_images: bool = True) -> List[Dict[str, Any]]:
+        """List all clothing items, optionally filtered by user.
+        
+        With ``include_images=False`` no image data is attached, for callers
+        that link to the image files instead.
+        """
         if self._mode == "local":
-            data = self._load_local()
-            items = data.get("wardrobe_items", [])
             if user_id:
-                items = [it for it in items if it.get("user_id") == user_id]
+                items = self._local_user_docs("wardrobe_items", user_id)
+            else:
+                items = self._load_local().get("wardrobe_items", [])
             # Sort newest first (created_at iso)
-            items = sorted(items, key=lambda d: str(d.get("created_at", "")), reverse=True)
-            return items[skip:skip + limit]
+            items = sorted(items, key=lambda d: d.get("created_at") or "", reverse=True)
+            return [self._local_list_doc(it, include_images) for it in items[skip:skip + limit]]
 
         if self._db is None:  # FIX: Check if db is not None
             return []
             
-        coll = self._db[self._config.wardrobe_collection]
+        coll = self._wardrobe_coll
 
         query = {}
         if user_id:
             query["user_id"] = user_id
 
-        docs = list(coll.find(query)
+        # batch_size matches limit so the whole page comes back in one round trip
+        docs = list(coll.find(query, self._list_projection(include_images))
                    .sort([("created_at", -1)])
                    .skip(skip)
-                   .limit(limit))
+                   .limit(limit)
+                   .batch_size(limit))
 
         for doc in docs:
             doc["_id"] = str(doc["_id"])
+            thumb = doc.pop("thumb_b64", None)
+            if not include_images:
+                continue
+            if thumb:
+                doc["image_base64"] = thumb
             if "image_file_id" in doc:
-                try:
-                    doc["image_base64"] = self.get_image_base64(doc["image_file_id"])
-                except Exception:
-                    doc["image_base64"] = None
+                doc["image_url"] = image_file_url(doc["image_file_id"])
 
         return docs
     
     def count_by_category(self, user_id: Optional[str] = None) -> Dict[str, int]:
         """Count items by category."""
         if self._mode == "local":
-            data = self._load_local()
-            items = data.get("wardrobe_items", [])
             if user_id:
-                items = [it for it in items if it.get("user_id") == user_id]
-            
-            result = {}
-            for item in items:
-                category = item.get("category", "unknown")
-                result[category] = result.get(category, 0) + 1
-            return result
+                return dict(self._local_counters(user_id)["by_category"])
+            items = self._load_local().get("wardrobe_items", [])
+            return dict(Counter(_category_key(item) for item in items))
 
         if self._db is None:  # FIX: Check if db is not None
             return {}
+        
+        if user_id:
+            counters = self._counters_coll.find_one({"_id": user_id})
+            if counters is not None:
+                return {c: n for c, n in counters.get("by_category", {}).items() if n > 0}
             
-        coll = self._db[self._config.wardrobe_collection]
+        coll = self._wardrobe_coll
         
         query = {}
         if user_id:
@@ -397,37 +1272,73 @@ class MongoDBClient:
         
         pipeline = [
             {"$match": query},
-            {"$group": {"_id": "$category", "count": {"$sum": 1}}}
+            {"$group": {"_id": {"$ifNull": ["$category", "unknown"]}, "count": {"$sum": 1}}}
         ]
         
         result = {}
         for doc in coll.aggregate(pipeline):
             result[doc["_id"]] = doc["count"]
         
+        # Seed the counters so later reads skip the aggregation; every write
+        # path keeps them exact from here on, so an existing doc is left alone
+        if user_id and all(_counter_key_ok(c) for c in result):
+            self._counters_coll.update_one(
+                {"_id": user_id}, {"$setOnInsert": {"by_category": result}}, upsert=True
+            )
         return result
     
+    def _bump_category_counts(self, docs: List[Dict[str, Any]], delta: int) -> None:
+        """Apply +/-1 per doc to its owner's category counters (only where counters exist)."""
+        changes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for doc in docs:
+            changes[doc.get("user_id")][_category_key(doc)] += delta
+        for user_id, by_category in changes.items():
+            if not all(_counter_key_ok(c) for c in by_category):
+                self._drop_category_counts([user_id])
+                continue
+            try:
+                self._counters_coll.update_one(
+                    {"_id": user_id},
+                    {"$inc": {f"by_category.{c}": n for c, n in by_category.items()}}
+                )
+            except Exception as e:
+                logger.warning("⚠️ Counter update failed for %s, dropping counters: %s", user_id, e)
+                self._drop_category_counts([user_id])
+    
+    def _drop_category_counts(self, user_ids) -> None:
+        """Delete users' counter documents so count_by_category rebuilds them."""
+        try:
+            self._counters_coll.delete_many({"_id": {"$in": list(user_ids)}})
+        except Exception as e:
+            logger.warning("⚠️ Could not drop category counters: %s", e)
+    
     def delete_clothing_item(self, item_id: str) -> bool:
         """Delete clothing item and its associated image."""
         if self._mode == "local":
             data = self._load_local()
-            before = len(data.get("wardrobe_items", []))
-            data["wardrobe_items"] = [it for it in data.get("wardrobe_items", []) if str(it.get("_id")) != str(item_id)]
-            after = len(data.get("wardrobe_items", []))
-            self._save_local(data)
-            return after < before
+            item = self._local_find("wardrobe_items", item_id)
+            removed = self._local_remove(data, "wardrobe_items", item_id)
+            if removed:
+                self._save_local(data)
+                self.invalidate_stats(item.get("user_id"))
+            return removed
 
         if self._db is None:  # FIX: Check if db is not None
             return False
             
-        coll = self._db[self._config.wardrobe_collection]
+        coll = self._wardrobe_coll
 
-        # Get item first to delete image
-        item = coll.find_one({"_id": ObjectId(item_id)})
+        # Get item first to delete image (only the fields needed here)
+        item = coll.find_one({"_id": ObjectId(item_id)},
+                             {"image_file_id": 1, "user_id": 1, "category": 1})
         if item and "image_file_id" in item:
             self.delete_image(item["image_file_id"])
 
         # Delete the item
         result = coll.delete_one({"_id": ObjectId(item_id)})
+        if result.deleted_count and item:
+            self._bump_category_counts([item], -1)
+            self.invalidate_stats(item.get("user_id"))
         return result.deleted_count > 0
     
     # ==================== OUTFIT HISTORY ====================
@@ -436,8 +1347,10 @@ class MongoDBClient:
                               occasion: str, weather: Dict[str, Any], 
                               user_feedback: Optional[Dict] = None) -> List[str]:
         """Save generated outfits to history."""
+        now = _utcnow()
         if self._mode == "local":
             data = self._load_local()
+            now_iso = now.isoformat()
             outfit_ids: List[str] = []
             for outfit in outfits:
                 oid = uuid.uuid4().hex
@@ -449,45 +1362,39 @@ class MongoDBClient:
                     "items": outfit.get("items", []),
                     "occasion": occasion,
                     "weather": weather,
-                    "generated_at": datetime.utcnow().isoformat(),
+                    "generated_at": now_iso,
                     "user_feedback": user_feedback or {},
                     "metadata": {"tags": []},
                 }
-                data.setdefault("outfit_history", []).append(doc)
+                self._local_insert(data, "outfit_history", doc)
                 outfit_ids.append(oid)
             self._save_local(data)
+            self.invalidate_stats(user_id)
             return outfit_ids
 
         if self._db is None:  # FIX: Check if db is not None
             raise Exception("Database not initialized")
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
-        outfit_ids = []
+        # Same weather for every outfit in the batch, so it is built once
+        weather_doc = {
+            "city": weather.get("city"),
+            "temp_c": weather.get("temp_c"),
+            "temp_f": weather.get("temp_f"),
+            "condition": weather.get("condition"),
+            "description": weather.get("description", "")
+        }
+        docs = []
         for outfit in outfits:
-            doc = {
+            docs.append({
                 "user_id": user_id,
                 "title": outfit.get("title", f"Outfit for {occasion}"),
                 "details": outfit.get("details", ""),
-                "items": [
-                    {
-                        "item_id": item.get("id"),
-                        "image_file_id": item.get("image_file_id"),
-                        "category": item.get("category"),
-                        "color": item.get("color"),
-                        "style_tags": item.get("style_tags", [])
-                    }
-                    for item in outfit.get("items", [])
-                ],
+                "items": [_history_item(item) for item in outfit.get("items", [])],
                 "occasion": occasion,
-                "weather": {
-                    "city": weather.get("city"),
-                    "temp_c": weather.get("temp_c"),
-                    "temp_f": weather.get("temp_f"),
-                    "condition": weather.get("condition"),
-                    "description": weather.get("description", "")
-                },
-                "generated_at": datetime.utcnow(),
+                "weather": weather_doc,
+                "generated_at": now,
                 "user_feedback": user_feedback or {},
                 "metadata": {
                     "outfit_score": outfit.get("score", 0.0),
@@ -497,63 +1404,74 @@ class MongoDBClient:
                         "num_outfits": len(outfits)
                     }
                 }
-            }
-            
-            result = coll.insert_one(doc)
-            outfit_ids.append(str(result.inserted_id))
+            })
         
-        return outfit_ids
+        if not docs:
+            return []
+        result = coll.insert_many(docs, ordered=False)
+        self.invalidate_stats(user_id)
+        return [str(outfit_id) for outfit_id in result.inserted_ids]
     
     def get_outfit_history(self, user_id: str, limit: int = 50, 
                           skip: int = 0, sort_by: str = "generated_at", 
-                          sort_order: int = -1) -> List[Dict[str, Any]]:
-        """Retrieve outfit history for a user."""
+                          sort_order: int = -1,
+                          fields: Optional[Tuple[str, ...]] = None) -> List[Dict[str, Any]]:
+        """Retrieve outfit history for a user (only ``fields`` from MongoDB, if given)."""
+        return list(self.iter_outfit_history(user_id, limit, skip, sort_by, sort_order, fields))
+    
+    def iter_outfit_history(self, user_id: str, limit: int = 50, 
+                            skip: int = 0, sort_by: str = "generated_at", 
+                            sort_order: int = -1,
+                            fields: Optional[Tuple[str, ...]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a user's outfit history as it comes off the cursor, for streaming responses."""
         if self._mode == "local":
-            data = self._load_local()
-            outfits = [o for o in data.get("outfit_history", []) if o.get("user_id") == user_id]
-            outfits = sorted(outfits, key=lambda d: str(d.get(sort_by, "")), reverse=(sort_order == -1))
-            return outfits[skip:skip + limit]
+            outfits = self._local_user_docs("outfit_history", user_id)
+            # Timestamps are ISO strings, which already sort chronologically
+            outfits = sorted(outfits, key=lambda d: d.get(sort_by) or "", reverse=(sort_order == -1))
+            # Copies, so callers can't change the cached store
+            yield from map(copy.deepcopy, outfits[skip:skip + limit])
+            return
 
         if self._db is None:  # FIX: Check if db is not None
-            return []
+            return
             
-        coll = self._db[self._config.outfit_history_collection]
-        
-        outfits = list(
-            coll.find({"user_id": user_id})
-            .sort(sort_by, sort_order)
-            .skip(skip)
-            .limit(limit)
-        )
+        coll = self._history_coll
+        projection = dict.fromkeys(fields, 1) if fields else None
+        cursor = coll.find({"user_id": user_id}, projection) \
+                     .sort(sort_by, sort_order) \
+                     .skip(skip) \
+                     .limit(limit) \
+                     .batch_size(limit)
         
         # Convert ObjectId and datetime for JSON serialization
-        for outfit in outfits:
+        for outfit in cursor:
             outfit["_id"] = str(outfit["_id"])
-            outfit["generated_at"] = outfit["generated_at"].isoformat()
+            if "generated_at" in outfit:
+                outfit["generated_at"] = outfit["generated_at"].isoformat()
             
-            # Add base64 images for frontend display
-            for item in outfit.get("items", []):
-                if "image_file_id" in item:
-                    try:
-                        item["image_base64"] = self.get_image_base64(item["image_file_id"])
-                    except:
-                        item["image_base64"] = None
-        
-        return outfits
+            # Link images for the frontend to fetch on demand
+            for item in outfit.get("items") or ():
+                if item.get("image_file_id"):
+                    item["image_url"] = image_file_url(item["image_file_id"], thumb=True)
+            yield outfit
     
-    def get_outfit_by_id(self, outfit_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        """Get a specific outfit by ID."""
+    def get_outfit_by_id(self, outfit_id: str, user_id: Optional[str] = None,
+                         include_images: bool = True) -> Optional[Dict[str, Any]]:
+        """Get a specific outfit by ID.
+        
+        With ``include_images=False`` the items' images are not read, for
+        callers that only need the outfit's metadata.
+        """
         if self._mode == "local":
-            data = self._load_local()
-            for o in data.get("outfit_history", []):
-                if str(o.get("_id")) == str(outfit_id) and (not user_id or o.get("user_id") == user_id):
-                    return o
-            return None
+            o = self._local_find("outfit_history", outfit_id)
+            if o is None or (user_id and o.get("user_id") != user_id):
+                return None
+            return copy.deepcopy(o)
 
         if self._db is None:  # FIX: Check if db is not None
             return None
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
         query = {"_id": ObjectId(outfit_id)}
         if user_id:
@@ -566,13 +1484,14 @@ class MongoDBClient:
         doc["_id"] = str(doc["_id"])
         doc["generated_at"] = doc["generated_at"].isoformat()
         
-        # Add base64 images
-        for item in doc.get("items", []):
-            if "image_file_id" in item:
-                try:
-                    item["image_base64"] = self.get_image_base64(item["image_file_id"])
-                except:
-                    item["image_base64"] = None
+        if not include_images:
+            return doc
+        
+        # Add base64 images, all read in one bulk query
+        items = [item for item in doc.get("items") or () if "image_file_id" in item]
+        images = self.get_images_base64_bulk([item["image_file_id"] for item in items])
+        for item in items:
+            item["image_base64"] = images.get(item["image_file_id"])
         
         return doc
     
@@ -581,112 +1500,159 @@ class MongoDBClient:
         """Update user feedback for an outfit."""
         if self._mode == "local":
             data = self._load_local()
-            changed = False
-            for o in data.get("outfit_history", []):
-                if str(o.get("_id")) == str(outfit_id) and o.get("user_id") == user_id:
-                    o["user_feedback"] = feedback_updates
-                    o["updated_at"] = datetime.utcnow().isoformat()
-                    changed = True
-                    break
-            if changed:
-                self._save_local(data)
-            return changed
+            o = self._local_find("outfit_history", outfit_id)
+            if o is None or o.get("user_id") != user_id:
+                return False
+            o["user_feedback"] = copy.deepcopy(feedback_updates)
+            o["updated_at"] = _utcnow().isoformat()
+            self._local_touch("outfit_history", outfit_id)
+            self._save_local(data)
+            self.invalidate_stats(user_id)
+            return True
 
         if self._db is None:  # FIX: Check if db is not None
             return False
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
         result = coll.update_one(
             {"_id": ObjectId(outfit_id), "user_id": user_id},
             {
                 "$set": {
                     "user_feedback": feedback_updates,
-                    "updated_at": datetime.utcnow()
+                    "updated_at": _utcnow()
                 }
             }
         )
         
+        if result.modified_count:
+            self.invalidate_stats(user_id)
         return result.modified_count > 0
     
     def add_outfit_tag(self, outfit_id: str, user_id: str, tag: str) -> bool:
         """Add a tag to an outfit."""
         if self._mode == "local":
             data = self._load_local()
-            changed = False
-            for o in data.get("outfit_history", []):
-                if str(o.get("_id")) == str(outfit_id) and o.get("user_id") == user_id:
-                    meta = o.setdefault("metadata", {})
-                    tags = meta.setdefault("tags", [])
-                    if tag not in tags:
-                        tags.append(tag)
-                        changed = True
-                    break
-            if changed:
-                self._save_local(data)
-            return changed
+            o = self._local_find("outfit_history", outfit_id)
+            if o is None or o.get("user_id") != user_id:
+                return False
+            tags = o.setdefault("metadata", {}).setdefault("tags", [])
+            if tag in tags:
+                return False
+            tags.append(tag)
+            if tag == "favorite":
+                self._local_drop_counters(data, user_id)
+            self._local_touch("outfit_history", outfit_id)
+            self._save_local(data)
+            self.invalidate_stats(user_id)
+            return True
         
         if self._db is None:  # FIX: Check if db is not None
             return False
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
         result = coll.update_one(
             {"_id": ObjectId(outfit_id), "user_id": user_id},
             {"$addToSet": {"metadata.tags": tag}}
         )
         
+        if result.modified_count:
+            self.invalidate_stats(user_id)
         return result.modified_count > 0
     
+    def add_outfit_tags(self, user_id: str, pairs: List[Tuple[str, str]]) -> int:
+        """Add several ``(outfit_id, tag)`` pairs in one write; returns how many were added."""
+        if not pairs:
+            return 0
+        if self._mode == "local":
+            data = self._load_local()
+            added = 0
+            for outfit_id, tag in pairs:
+                o = self._local_find("outfit_history", outfit_id)
+                if o is None or o.get("user_id") != user_id:
+                    continue
+                tags = o.setdefault("metadata", {}).setdefault("tags", [])
+                if tag in tags:
+                    continue
+                tags.append(tag)
+                if tag == "favorite":
+                    self._local_drop_counters(data, user_id)
+                self._local_touch("outfit_history", outfit_id)
+                added += 1
+            if added:
+                self._save_local(data)
+                self.invalidate_stats(user_id)
+            return added
+        
+        if self._db is None:
+            return 0
+        
+        result = self._history_coll.bulk_write(
+            [UpdateOne({"_id": ObjectId(outfit_id), "user_id": user_id},
+                       {"$addToSet": {"metadata.tags": tag}})
+             for outfit_id, tag in pairs],
+            ordered=False,
+        )
+        if result.modified_count:
+            self.invalidate_stats(user_id)
+        return result.modified_count
+    
     def remove_outfit_tag(self, outfit_id: str, user_id: str, tag: str) -> bool:
         """Remove a tag from an outfit."""
         if self._db is None:  # FIX: Check if db is not None
             return False
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
         result = coll.update_one(
             {"_id": ObjectId(outfit_id), "user_id": user_id},
             {"$pull": {"metadata.tags": tag}}
         )
         
+        if result.modified_count:
+            self.invalidate_stats(user_id)
         return result.modified_count > 0
     
-    def get_favorite_outfits(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Get outfits marked as favorites."""
+    def get_favorite_outfits(self, user_id: str, limit: int = 20,
+                             fields: Optional[Tuple[str, ...]] = None) -> List[Dict[str, Any]]:
+        """Get outfits marked as favorites (only ``fields`` from MongoDB, if given)."""
+        return list(self.iter_favorite_outfits(user_id, limit, fields))
+    
+    def iter_favorite_outfits(self, user_id: str, limit: int = 20,
+                              fields: Optional[Tuple[str, ...]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a user's favorite outfits as they come off the cursor."""
         if self._mode == "local":
-            data = self._load_local()
-            outfits = [o for o in data.get("outfit_history", []) if o.get("user_id") == user_id and "favorite" in (o.get("metadata", {}).get("tags", []) or [])]
-            outfits = sorted(outfits, key=lambda d: str(d.get("generated_at", "")), reverse=True)
-            return outfits[:limit]
+            outfits = list(filter(_is_favorite, self._local_user_docs("outfit_history", user_id)))
+            outfits = sorted(outfits, key=lambda d: d.get("generated_at") or "", reverse=True)
+            yield from map(copy.deepcopy, outfits[:limit])
+            return
         
         if self._db is None:  # FIX: Check if db is not None
-            return []
+            return
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
-        outfits = list(
-            coll.find({
-                "user_id": user_id,
-                "metadata.tags": "favorite"
-            })
-            .sort("generated_at", -1)
-            .limit(limit)
-        )
+        cursor = coll.find({
+            "user_id": user_id,
+            "metadata.tags": "favorite"
+        }, dict.fromkeys(fields, 1) if fields else None) \
+            .sort("generated_at", -1) \
+            .limit(limit) \
+            .batch_size(limit)
+        if self._favorites_index:
+            cursor = cursor.hint(FAVORITES_INDEX)
         
-        for outfit in outfits:
+        for outfit in cursor:
             outfit["_id"] = str(outfit["_id"])
-            outfit["generated_at"] = outfit["generated_at"].isoformat()
+            if "generated_at" in outfit:
+                outfit["generated_at"] = outfit["generated_at"].isoformat()
             
-            # Add base64 images
-            for item in outfit.get("items", []):
-                if "image_file_id" in item:
-                    try:
-                        item["image_base64"] = self.get_image_base64(item["image_file_id"])
-                    except:
-                        item["image_base64"] = None
-        
-        return outfits
+            # Link images for the frontend to fetch on demand
+            for item in outfit.get("items") or ():
+                if item.get("image_file_id"):
+                    item["image_url"] = image_file_url(item["image_file_id"], thumb=True)
+            yield outfit
     
     def get_outfits_containing_item(self, item_id: str, user_id: str, 
                                    limit: int = 50) -> List[Dict[str, Any]]:
@@ -694,7 +1660,7 @@ class MongoDBClient:
         if self._db is None:  # FIX: Check if db is not None
             return []
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
         outfits = list(
             coll.find({
@@ -703,6 +1669,7 @@ class MongoDBClient:
             })
             .sort("generated_at", -1)
             .limit(limit)
+            .batch_size(limit)
         )
         
         for outfit in outfits:
@@ -716,13 +1683,15 @@ class MongoDBClient:
         if self._db is None:  # FIX: Check if db is not None
             return False
             
-        coll = self._db[self._config.outfit_history_collection]
+        coll = self._history_coll
         
         result = coll.delete_one({
             "_id": ObjectId(outfit_id),
             "user_id": user_id
         })
         
+        if result.deleted_count:
+            self.invalidate_stats(user_id)
         return result.deleted_count > 0
     
     # ==================== USER MANAGEMENT ====================
@@ -732,10 +1701,9 @@ class MongoDBClient:
         if self._db is None:  # FIX: Check if db is not None
             raise Exception("Database not initialized")
             
-        coll = self._db[self._config.users_collection]
+        coll = self._users_coll
         
-        user_data["created_at"] = datetime.utcnow()
-        user_data["updated_at"] = datetime.utcnow()
+        user_data["created_at"] = user_data["updated_at"] = _utcnow()
         
         result = coll.insert_one(user_data)
         return str(result.inserted_id)
@@ -745,7 +1713,7 @@ class MongoDBClient:
         if self._db is None:  # FIX: Check if db is not None
             return None
             
-        coll = self._db[self._config.users_collection]
+        coll = self._users_coll
         
         doc = coll.find_one({"_id": ObjectId(user_id)})
         if doc:
@@ -757,7 +1725,7 @@ class MongoDBClient:
         if self._db is None:  # FIX: Check if db is not None
             return None
             
-        coll = self._db[self._config.users_collection]
+        coll = self._users_coll
         
         doc = coll.find_one({"email": email})
         if doc:
@@ -769,9 +1737,9 @@ class MongoDBClient:
         if self._db is None:  # FIX: Check if db is not None
             return False
             
-        coll = self._db[self._config.users_collection]
+        coll = self._users_coll
         
-        updates["updated_at"] = datetime.utcnow()
+        updates["updated_at"] = _utcnow()
         result = coll.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": updates}
@@ -782,29 +1750,47 @@ class MongoDBClient:
     # ==================== STATISTICS ====================
     
     def get_user_statistics(self, user_id: str) -> Dict[str, Any]:
-        """Get statistics for a user."""
+        """Get statistics for a user (cached for stats_cache_ttl seconds, dropped on writes)."""
+        now = time.monotonic()
+        with self._stats_cache_lock:
+            entry = self._stats_cache.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._stats_cache_hits += 1
+                return copy.deepcopy(entry[1])
+            self._stats_cache_misses += 1
+        
+        stats = self._compute_user_statistics(user_id)
+        if self._config.stats_cache_ttl > 0:
+            with self._stats_cache_lock:
+                self._stats_cache.pop(user_id, None)
+                self._stats_cache[user_id] = (now + self._config.stats_cache_ttl, copy.deepcopy(stats))
+                while len(self._stats_cache) > self._config.stats_cache_size:
+                    self._stats_cache.popitem(last=False)
+        return stats
+    
+    def invalidate_stats(self, *user_ids: Optional[str]) -> None:
+        """Drop cached statistics for the given users."""
+        with self._stats_cache_lock:
+            for user_id in user_ids:
+                self._stats_cache.pop(user_id, None)
+    
+    def stats_cache_info(self) -> Dict[str, int]:
+        """Hit/miss counters and current size of the statistics cache."""
+        with self._stats_cache_lock:
+            return {
+                "hits": self._stats_cache_hits,
+                "misses": self._stats_cache_misses,
+                "size": len(self._stats_cache),
+            }
+    
+    def _compute_user_statistics(self, user_id: str) -> Dict[str, Any]:
         if self._mode == "local":
-            data = self._load_local()
-            wardrobe_items = [it for it in data.get("wardrobe_items", []) if it.get("user_id") == user_id]
-            outfits = [o for o in data.get("outfit_history", []) if o.get("user_id") == user_id]
-            
-            # Count by category
-            category_counts = {}
-            for item in wardrobe_items:
-                category = item.get("category", "unknown")
-                category_counts[category] = category_counts.get(category, 0) + 1
-            
-            # Count favorite outfits
-            favorite_outfits = sum(1 for o in outfits if "favorite" in (o.get("metadata", {}).get("tags", []) or []))
-            
+            counters = self._local_counters(user_id)
             return {
-                "wardrobe": {
-                    "total_items": len(wardrobe_items),
-                    "by_category": category_counts
-                },
+                "wardrobe": self.get_user_overview(user_id),
                 "outfits": {
-                    "total_generated": len(outfits),
-                    "favorites": favorite_outfits,
+                    "total_generated": counters["outfit_total"],
+                    "favorites": counters["favorites"],
                     "most_used_items": []
                 }
             }
@@ -813,47 +1799,66 @@ class MongoDBClient:
             return {"wardrobe": {"total_items": 0, "by_category": {}}, 
                     "outfits": {"total_generated": 0, "favorites": 0, "most_used_items": []}}
             
-        wardrobe_coll = self._db[self._config.wardrobe_collection]
-        history_coll = self._db[self._config.outfit_history_collection]
-        
-        # Count wardrobe items
-        total_items = wardrobe_coll.count_documents({"user_id": user_id})
-        
-        # Count by category
-        category_counts = self.count_by_category(user_id)
-        
-        # Count outfits generated
-        total_outfits = history_coll.count_documents({"user_id": user_id})
-        
-        # Favorite outfits
-        favorite_outfits = history_coll.count_documents({
-            "user_id": user_id,
-            "metadata.tags": "favorite"
-        })
-        
-        # Most used items
+        # Wardrobe and history facets in one round trip: the history
+        # pipeline is appended with $unionWith and each branch is tagged
         pipeline = [
             {"$match": {"user_id": user_id}},
-            {"$unwind": "$items"},
-            {"$group": {"_id": "$items.item_id", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 5}
+            {"$project": _WARDROBE_FACET_FIELDS},
+            {"$facet": _WARDROBE_FACETS},
+            {"$set": {"_src": "wardrobe"}},
+            {"$unionWith": {"coll": self._config.outfit_history_collection, "pipeline": [
+                {"$match": {"user_id": user_id}},
+                {"$project": _HISTORY_FACET_FIELDS},
+                {"$facet": _HISTORY_FACETS},
+                {"$set": {"_src": "history"}},
+            ]}},
         ]
-        
-        most_used = list(history_coll.aggregate(pipeline))
+        facets = {doc.pop("_src"): doc for doc in self._wardrobe_coll.aggregate(pipeline)}
+        history = facets.get("history", {})
         
         return {
-            "wardrobe": {
-                "total_items": total_items,
-                "by_category": category_counts
-            },
+            "wardrobe": _overview_from_facets(facets.get("wardrobe", {})),
             "outfits": {
-                "total_generated": total_outfits,
-                "favorites": favorite_outfits,
-                "most_used_items": most_used
+                "total_generated": _facet_count(history.get("total")),
+                "favorites": _facet_count(history.get("favorites")),
+                "most_used_items": history.get("most_used", [])
             }
         }
     
+    def collection_totals(self) -> Dict[str, int]:
+        """Approximate document counts across all users, read from collection metadata."""
+        if self._mode == "local":
+            data = self._load_local()
+            return {name: len(data.get(name, [])) for name in ("wardrobe_items", "outfit_history")}
+        if self._db is None:
+            return {"wardrobe_items": 0, "outfit_history": 0}
+        return {
+            "wardrobe_items": self._wardrobe_coll.estimated_document_count(),
+            "outfit_history": self._history_coll.estimated_document_count(),
+        }
+    
+    def get_user_overview(self, user_id: str) -> Dict[str, Any]:
+        """Wardrobe totals for a user: item count plus counts by category and formality.
+        
+        In MongoDB mode this is one aggregation with a $facet per breakdown.
+        """
+        if self._mode == "local":
+            counters = self._local_counters(user_id)
+            return {
+                "total_items": counters["wardrobe_total"],
+                "by_category": dict(counters["by_category"]),
+                "by_formality": dict(counters["by_formality"]),
+            }
+        if self._db is None:
+            return {"total_items": 0, "by_category": {}, "by_formality": {}}
+        
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$project": _WARDROBE_FACET_FIELDS},
+            {"$facet": _WARDROBE_FACETS},
+        ]
+        return _overview_from_facets(next(self._wardrobe_coll.aggregate(pipeline), {}))
+    
     # ==================== CLEANUP ====================
     
     def close(self):
@@ -862,14 +1867,25 @@ class MongoDBClient:
             self._client.close()
 
 
+class _LazyClient:
+    """Stand-in for the shared MongoDBClient, which connects on first use instead of at import."""
+    
+    def __getattr__(self, name: str) -> Any:
+        client = MongoDBClient._instance or MongoDBClient()
+        return getattr(client, name)
+
+
 # Singleton instance
-db_client = MongoDBClient()
+db_client = _LazyClient()
 
 
 # Legacy functions for backward compatibility
 def save_clothing_item(doc: Dict[str, Any]) -> str:
     return db_client.save_clothing_item(doc)
 
+def save_clothing_items(docs: List[Dict[str, Any]]) -> List[str]:
+    return db_client.save_clothing_items(docs)
+
 def update_clothing_item(item_id: str, updates: Dict[str, Any]) -> bool:
     return db_client.update_clothing_item(item_id, updates)
 
@@ -891,7 +1907,8 @@ def get_outfit_history(user_id: Optional[str] = None, limit: int = 50,
                       sort_order: int = -1) -> List[Dict[str, Any]]:
     if not user_id:
         user_id = "anonymous"
-    return db_client.get_outfit_history(user_id, limit, skip, sort_by, sort_order)
+    return db_client.get_outfit_history(user_id, limit, skip, sort_by, sort_order,
+                                        fields=MongoDBClient.HISTORY_LIST_FIELDS)
 
 def get_outfit_by_id(outfit_id: str) -> Optional[Dict[str, Any]]:
     return db_client.get_outfit_by_id(outfit_id)
@@ -904,42 +1921,11 @@ def add_outfit_tag(outfit_id: str, tag: str) -> bool:
     # Note: This legacy function doesn't have user_id, using "anonymous"
     return db_client.add_outfit_tag(outfit_id, "anonymous", tag)
 
+def add_outfit_tags(pairs: List[Tuple[str, str]]) -> int:
+    # Note: This legacy function doesn't have user_id, using "anonymous"
+    return db_client.add_outfit_tags("anonymous", pairs)
+
 def get_favorite_outfits(user_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
     if not user_id:
         user_id = "anonymous"
-    return db_client.get_favorite_outfits(user_id, limit)
-# Add debug logging to _init_client() method:
-
-def _init_client(self):
-    """Initialize MongoDB connection (preferred) or fall back to a local JSON store."""
-    config = DatabaseConfig()
-    self._config = config
-    
-    print(f"🔧 MongoDB URI: {config.uri}")
-    print(f"🔧 Database name: {config.db_name}")
-    
-    try:
-        # Try MongoDB with timeout
-        self._client = MongoClient(config.uri, serverSelectionTimeoutMS=3000)  # Increased timeout
-        self._client.admin.command("ping")
-        self._db = self._client[config.db_name]
-        self._fs = gridfs.GridFS(self._db)
-        self._mode = "mongo"
-        print(f"✅ Connected to MongoDB: {config.db_name}")
-        
-        # Test connection with a simple operation
-        test_coll = self._db["test"]
-        test_coll.insert_one({"test": datetime.utcnow()})
-        print("✅ MongoDB write test successful")
-        
-        self._create_indexes()
-        
-    except Exception as e:
-        print(f"⚠️ MongoDB connection failed: {e}")
-        print("🔄 Switching to local fallback mode...")
-        self._client = None
-        self._db = None
-        self._fs = None
-        self._mode = "local"
-        self._ensure_local_db()
-        print("✅ Using local fallback storage")
\ No newline at end of file
+    return db_client.get_favorite_outfits(user_id, limit, fields=MongoDBClient.HISTORY_LIST_FIELDS)
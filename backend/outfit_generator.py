@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 import os
+import re
+import json
+import functools
 import time
 import random
-from dataclasses import dataclass, field
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from typing import Any, Dict, Iterable, List, Optional, Tuple, Set
 from datetime import datetime
 from enum import Enum
 import numpy as np
 
-from dotenv import load_dotenv
-
+from config import load_env
 from mongodb_client import db_client
 from wardrobe_database import WardrobeDatabase
 from style_scoring import (
@@ -21,7 +27,9 @@ from style_scoring import (
     normalize_category,
 )
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 
 class OutfitType(Enum):
@@ -67,36 +75,19 @@ class GenerationContext:
     available_items: List[Dict[str, Any]]
     focus_item: Optional[Dict[str, Any]] = None
     blacklisted_item_ids: Set[str] = field(default_factory=set)
+    # Suitability of available_items[i], filled in by _precompute_context
+    suitability: Optional[np.ndarray] = None
+    # Positions in available_items per category and per item id, filled in
+    # by _index_categories
+    category_positions: Dict[str, np.ndarray] = field(default_factory=dict)
+    item_positions: Dict[str, int] = field(default_factory=dict)
 
 
 # -----------------------------
 # Optional Gemini helper (enhanced)
 # -----------------------------
 
-def _enhanced_gemini_refine(outfits: List[Dict[str, Any]], occasion: str, 
-                           weather: Dict[str, Any], user_id: str) -> None:
-    """Ask Gemini to refine outfit descriptions and provide styling tips."""
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        return
-    
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        for outfit in outfits:
-            items = outfit.get("items") or []
-            
-            # Prepare item details
-            item_details = []
-            for i, item in enumerate(items):
-                cat = item.get('category', 'item')
-                color = item.get('color', '')
-                style = ', '.join(item.get('style_tags', [])[:3])
-                item_details.append(f"{i+1}. {cat} ({color}) - {style}")
-            
-            prompt = f"""
+_GEMINI_PROMPT_TEMPLATE = """
             You are a professional fashion stylist. Analyze this outfit and provide:
             1. A catchy, engaging title (max 5 words)
             2. A detailed description of the outfit (2-3 sentences)
@@ -105,11 +96,11 @@ def _enhanced_gemini_refine(outfits: List[Dict[str, Any]], occasion: str,
             
             Outfit Context:
             - Occasion: {occasion}
-            - Weather: {weather.get('temp_c')}°C, {weather.get('condition')} in {weather.get('city')}
+            - Weather: {temp_c}°C, {condition} in {city}
             - User Profile: Fashion-conscious individual
             
             Outfit Items:
-            {chr(10).join(item_details)}
+            {items}
             
             Respond in JSON format:
             {{
@@ -119,32 +110,79 @@ def _enhanced_gemini_refine(outfits: List[Dict[str, Any]], occasion: str,
                 "suitability_score": number
             }}
             """
+
+# JSON object in a Gemini reply (which may wrap it in prose or code fences)
+_GEMINI_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+# Upper bound on concurrent Gemini requests per generation
+GEMINI_MAX_WORKERS = 8
+
+
+def _gemini_refine_one(model: Any, outfit: Dict[str, Any], occasion: str,
+                       weather: Dict[str, Any]) -> None:
+    """Refine a single outfit in place; failures keep the original data."""
+    items = outfit.get("items") or []
+    
+    # Prepare item details
+    item_details = []
+    for i, item in enumerate(items):
+        cat = item.get('category', 'item')
+        color = item.get('color', '')
+        style = ', '.join(item.get('style_tags', [])[:3])
+        item_details.append(f"{i+1}. {cat} ({color}) - {style}")
+    
+    prompt = _GEMINI_PROMPT_TEMPLATE.format(
+        occasion=occasion,
+        temp_c=weather.get('temp_c'),
+        condition=weather.get('condition'),
+        city=weather.get('city'),
+        items="\n".join(item_details),
+    )
+    
+    try:
+        resp = model.generate_content(prompt)
+        txt = (getattr(resp, "text", None) or "").strip()
+        
+        # Find JSON in the response
+        json_match = _GEMINI_JSON_RE.search(txt)
+        if json_match:
+            data = json.loads(json_match.group())
             
-            try:
-                resp = model.generate_content(prompt)
-                txt = (getattr(resp, "text", None) or "").strip()
-                
-                # Extract JSON from response
-                import json
-                import re
-                
-                # Find JSON in the response
-                json_match = re.search(r'\{.*\}', txt, re.DOTALL)
-                if json_match:
-                    data = json.loads(json_match.group())
-                    
-                    # Update outfit with AI suggestions
-                    outfit["ai_title"] = data.get("title", outfit.get("title", ""))
-                    outfit["ai_description"] = data.get("description", "")
-                    outfit["styling_tips"] = data.get("styling_tips", [])
-                    outfit["suitability_score"] = data.get("suitability_score", 7)
-                    
-                    # Keep original title as fallback
-                    if "title" not in outfit:
-                        outfit["title"] = outfit["ai_title"]
-            except Exception as e:
-                # Silently fail - keep original data
-                continue
+            # Update outfit with AI suggestions
+            outfit["ai_title"] = data.get("title", outfit.get("title", ""))
+            outfit["ai_description"] = data.get("description", "")
+            outfit["styling_tips"] = data.get("styling_tips", [])
+            outfit["suitability_score"] = data.get("suitability_score", 7)
+            
+            # Keep original title as fallback
+            if "title" not in outfit:
+                outfit["title"] = outfit["ai_title"]
+    except Exception:
+        # Silently fail - keep original data
+        return
+
+
+def _enhanced_gemini_refine(outfits: List[Dict[str, Any]], occasion: str, 
+                           weather: Dict[str, Any], user_id: str) -> None:
+    """Ask Gemini to refine outfit descriptions and provide styling tips.
+    
+    Outfits are refined concurrently, so the wait is roughly one round-trip
+    rather than one per outfit.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key or not outfits:
+        return
+    
+    try:
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel("gemini-1.5-flash")
+        
+        workers = min(GEMINI_MAX_WORKERS, len(outfits))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each call only touches its own outfit dict
+            list(pool.map(lambda o: _gemini_refine_one(model, o, occasion, weather), outfits))
                 
     except Exception:
         # Never fail generation because of Gemini
@@ -159,13 +197,17 @@ class ColorHarmony:
     """Advanced color harmony system."""
     
     COLOR_FAMILIES = {
-        "neutral": {"black", "white", "gray", "grey", "beige", "brown", "navy", "cream", "khaki"},
-        "warm": {"red", "orange", "yellow", "pink", "coral", "peach", "gold"},
-        "cool": {"blue", "green", "purple", "teal", "turquoise", "lavender", "mint"},
-        "earth": {"brown", "beige", "olive", "mustard", "rust", "terracotta"},
-        "jewel": {"emerald", "sapphire", "ruby", "amethyst", "topaz"}
+        "neutral": frozenset({"black", "white", "gray", "grey", "beige", "brown", "navy", "cream", "khaki"}),
+        "warm": frozenset({"red", "orange", "yellow", "pink", "coral", "peach", "gold"}),
+        "cool": frozenset({"blue", "green", "purple", "teal", "turquoise", "lavender", "mint"}),
+        "earth": frozenset({"brown", "beige", "olive", "mustard", "rust", "terracotta"}),
+        "jewel": frozenset({"emerald", "sapphire", "ruby", "amethyst", "topaz"})
     }
     
+    _NEUTRALS = COLOR_FAMILIES["neutral"]
+    _CLASH_FROM = frozenset({"warm", "earth"})
+    _CLASH_TO = frozenset({"cool", "jewel"})
+    
     COMPLEMENTARY_PAIRS = {
         "red": "green",
         "orange": "blue",
@@ -183,10 +225,16 @@ class ColorHarmony:
         "purple": ["lavender", "pink", "blue"]
     }
     
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _norm(color: Optional[str]) -> str:
+        """Lower-cased color name, with None treated as unknown."""
+        return (color or "unknown").lower()
+    
     @classmethod
     def get_color_family(cls, color: str) -> str:
         """Determine which family a color belongs to."""
-        color_lower = color.lower()
+        color_lower = cls._norm(color)
         for family, colors in cls.COLOR_FAMILIES.items():
             if color_lower in colors:
                 return family
@@ -195,24 +243,24 @@ class ColorHarmony:
     @classmethod
     def calculate_harmony_score(cls, color1: str, color2: str) -> float:
         """Calculate harmony score between two colors (0-1)."""
+        color1 = cls._norm(color1)
+        color2 = cls._norm(color2)
+        
         if color1 == "unknown" or color2 == "unknown":
             return 0.6
         
-        color1 = color1.lower()
-        color2 = color2.lower()
-        
         # Same color - good harmony
         if color1 == color2:
             return 0.8
         
         # Both neutrals - always good
-        if (color1 in cls.COLOR_FAMILIES["neutral"] and 
-            color2 in cls.COLOR_FAMILIES["neutral"]):
+        neutral1 = color1 in cls._NEUTRALS
+        neutral2 = color2 in cls._NEUTRALS
+        if neutral1 and neutral2:
             return 0.9
         
         # One neutral - good with anything
-        if (color1 in cls.COLOR_FAMILIES["neutral"] or 
-            color2 in cls.COLOR_FAMILIES["neutral"]):
+        if neutral1 or neutral2:
             return 0.85
         
         # Complementary colors - great harmony
@@ -232,7 +280,7 @@ class ColorHarmony:
             return 0.8
         
         # Different warm/cool families - potential clash
-        if (family1 in ["warm", "earth"] and family2 in ["cool", "jewel"]):
+        if family1 in cls._CLASH_FROM and family2 in cls._CLASH_TO:
             return 0.5
         
         # Default moderate harmony
@@ -274,15 +322,31 @@ class StyleCompatibility:
     """Advanced style compatibility system."""
     
     STYLE_CATEGORIES = {
-        "minimal": {"simple", "clean", "basic", "neutral"},
-        "streetwear": {"urban", "casual", "edgy", "sporty"},
-        "classic": {"timeless", "elegant", "traditional", "sophisticated"},
-        "bohemian": {"boho", "flowy", "patterned", "natural"},
-        "glam": {"glamorous", "sparkly", "luxurious", "evening"},
-        "sporty": {"athletic", "active", "comfortable", "performance"},
-        "business": {"professional", "tailored", "sharp", "formal"}
+        "minimal": frozenset({"simple", "clean", "basic", "neutral"}),
+        "streetwear": frozenset({"urban", "casual", "edgy", "sporty"}),
+        "classic": frozenset({"timeless", "elegant", "traditional", "sophisticated"}),
+        "bohemian": frozenset({"boho", "flowy", "patterned", "natural"}),
+        "glam": frozenset({"glamorous", "sparkly", "luxurious", "evening"}),
+        "sporty": frozenset({"athletic", "active", "comfortable", "performance"}),
+        "business": frozenset({"professional", "tailored", "sharp", "formal"})
     }
     
+    COMPATIBLE_PAIRS = frozenset({
+        ("minimal", "classic"),
+        ("minimal", "business"),
+        ("classic", "business"),
+        ("streetwear", "sporty"),
+        ("bohemian", "glam")
+    })
+    
+    CLASHING_PAIRS = frozenset({
+        ("sporty", "business"),
+        ("streetwear", "glam"),
+        ("bohemian", "business")
+    })
+    
+    _NEUTRAL_CATEGORIES = frozenset({"minimal", "classic"})
+    
     @classmethod
     def get_style_category(cls, tags: List[str]) -> str:
         """Determine the dominant style category from tags."""
@@ -304,37 +368,26 @@ class StyleCompatibility:
         if not item1_tags or not item2_tags:
             return 0.7
         
-        cat1 = cls.get_style_category(item1_tags)
-        cat2 = cls.get_style_category(item2_tags)
-        
+        return cls.calculate_category_compatibility(cls.get_style_category(item1_tags),
+                                                    cls.get_style_category(item2_tags))
+    
+    @classmethod
+    def calculate_category_compatibility(cls, cat1: str, cat2: str) -> float:
+        """Compatibility between two style categories."""
         # Same category - perfect match
         if cat1 == cat2:
             return 1.0
         
         # Compatible categories
-        compatible_pairs = {
-            ("minimal", "classic"),
-            ("minimal", "business"),
-            ("classic", "business"),
-            ("streetwear", "sporty"),
-            ("bohemian", "glam")
-        }
-        
-        if (cat1, cat2) in compatible_pairs or (cat2, cat1) in compatible_pairs:
+        if (cat1, cat2) in cls.COMPATIBLE_PAIRS or (cat2, cat1) in cls.COMPATIBLE_PAIRS:
             return 0.8
         
         # Neutral categories (minimal, classic) work with most things
-        if cat1 in ["minimal", "classic"] or cat2 in ["minimal", "classic"]:
+        if cat1 in cls._NEUTRAL_CATEGORIES or cat2 in cls._NEUTRAL_CATEGORIES:
             return 0.75
         
         # Potentially clashing categories
-        clashing_pairs = {
-            ("sporty", "business"),
-            ("streetwear", "glam"),
-            ("bohemian", "business")
-        }
-        
-        if (cat1, cat2) in clashing_pairs or (cat2, cat1) in clashing_pairs:
+        if (cat1, cat2) in cls.CLASHING_PAIRS or (cat2, cat1) in cls.CLASHING_PAIRS:
             return 0.5
         
         # Default moderate compatibility
@@ -379,6 +432,79 @@ class StyleCompatibility:
         return recommendations["casual"]  # Default
 
 
+# -----------------------------
+# Compatibility Lookup Tables
+# -----------------------------
+
+class CompatibilityTables:
+    """Color harmony and style compatibility scores for every pair, as matrices.
+    
+    Both rule chains only look at the two (lower-cased) colors or the two
+    dominant style categories, so each pair is scored once and scoring an
+    item against an outfit becomes an array gather. Colors outside the
+    known vocabulary get a row and column the first time they are seen.
+    """
+    
+    # Past this many colors, new ones share one extra slot (scored as an unlisted color)
+    MAX_COLORS = 1024
+    OTHER_COLOR = "~other"
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.color_ids: Dict[str, int] = {}
+        self.harmony = np.zeros((0, 0))
+        known = set(ColorHarmony.COMPLEMENTARY_PAIRS) | set(ColorHarmony.COMPLEMENTARY_PAIRS.values())
+        for family in ColorHarmony.COLOR_FAMILIES.values():
+            known |= family
+        for base, analogous in ColorHarmony.ANALOGOUS_RANGES.items():
+            known |= {base, *analogous}
+        self._add_colors(["unknown", self.OTHER_COLOR, *sorted(known)])
+        
+        # Style categories, plus one last slot for items without style tags
+        categories = list(StyleCompatibility.STYLE_CATEGORIES)
+        self.style_ids = {cat: i for i, cat in enumerate(categories)}
+        self.no_style = len(categories)
+        self.style = np.full((len(categories) + 1, len(categories) + 1), 0.7)
+        for i, cat1 in enumerate(categories):
+            for j, cat2 in enumerate(categories):
+                self.style[i, j] = StyleCompatibility.calculate_category_compatibility(cat1, cat2)
+    
+    def _add_colors(self, colors: List[str]) -> None:
+        """Grow the harmony matrix by ``colors`` (callers hold the lock, or are __init__)."""
+        old = len(self.color_ids)
+        vocab = list(self.color_ids) + colors
+        harmony = np.empty((len(vocab), len(vocab)))
+        harmony[:old, :old] = self.harmony
+        for i, color1 in enumerate(vocab):
+            for j in range(old if i < old else 0, len(vocab)):
+                harmony[i, j] = ColorHarmony.calculate_harmony_score(color1, vocab[j])
+        # Publish the matrix before the ids that index into it
+        self.harmony = harmony
+        for i, color in enumerate(colors, start=old):
+            self.color_ids[color] = i
+    
+    def color_id(self, color: Any) -> int:
+        key = "unknown" if color is None else str(color).lower()
+        cid = self.color_ids.get(key)
+        if cid is None:
+            with self._lock:
+                cid = self.color_ids.get(key)
+                if cid is None:
+                    if len(self.color_ids) >= self.MAX_COLORS:
+                        return self.color_ids[self.OTHER_COLOR]
+                    self._add_colors([key])
+                    cid = self.color_ids[key]
+        return cid
+    
+    def style_id(self, tags: Optional[Iterable[str]]) -> int:
+        if not tags:
+            return self.no_style
+        return self.style_ids[StyleCompatibility.get_style_category(tags)]
+
+
+COMPAT_TABLES = CompatibilityTables()
+
+
 # -----------------------------
 # Cache System
 # -----------------------------
@@ -396,44 +522,44 @@ class EnhancedCache:
     def __init__(self, ttl_seconds: int = 30, max_size: int = 128):
         self.ttl_seconds = ttl_seconds
         self.max_size = max_size
-        self._data: Dict[str, CacheEntry] = {}
-        self._access_times: Dict[str, float] = {}
+        # Least recently used first
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
     
     def get(self, key: str) -> Optional[Any]:
         now = time.time()
-        ent = self._data.get(key)
-        
-        if not ent:
-            return None
-        
-        if ent.expires_at < now:
-            self._data.pop(key, None)
-            self._access_times.pop(key, None)
-            return None
-        
-        # Update access time (LRU)
-        self._access_times[key] = now
-        return ent.value
+        with self._lock:
+            ent = self._data.get(key)
+            
+            if not ent:
+                return None
+            
+            if ent.expires_at < now:
+                del self._data[key]
+                return None
+            
+            # Mark as most recently used (LRU)
+            self._data.move_to_end(key)
+            return ent.value
     
     def set(self, key: str, value: Any, generation_params: Dict[str, Any]) -> None:
         now = time.time()
         
-        # Evict if needed (LRU)
-        if len(self._data) >= self.max_size:
-            oldest_key = min(self._access_times.items(), key=lambda x: x[1])[0]
-            self._data.pop(oldest_key, None)
-            self._access_times.pop(oldest_key, None)
-        
-        self._data[key] = CacheEntry(
-            value=value,
-            expires_at=now + self.ttl_seconds,
-            generation_params=generation_params
-        )
-        self._access_times[key] = now
+        with self._lock:
+            self._data.pop(key, None)
+            # Evict if needed (LRU)
+            if len(self._data) >= self.max_size:
+                self._data.popitem(last=False)
+            
+            self._data[key] = CacheEntry(
+                value=value,
+                expires_at=now + self.ttl_seconds,
+                generation_params=generation_params
+            )
     
     def clear(self) -> None:
-        self._data.clear()
-        self._access_times.clear()
+        with self._lock:
+            self._data.clear()
 
 
 # -----------------------------
@@ -452,13 +578,10 @@ class EnhancedOutfitGenerator:
         
     def _categorize_items(self, items: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         """Categorize items by normalized category."""
-        categorized = {}
+        categorized = defaultdict(list)
         for item in items:
-            cat = normalize_category(item.get("category"))
-            if cat not in categorized:
-                categorized[cat] = []
-            categorized[cat].append(item)
-        return categorized
+            categorized[normalize_category(item.get("category"))].append(item)
+        return dict(categorized)
     
     def _determine_outfit_type(self, occasion: str) -> OutfitType:
         """Determine outfit type based on occasion."""
@@ -571,6 +694,37 @@ class EnhancedOutfitGenerator:
         
         return score
     
+    def _precompute_context(self, context: GenerationContext) -> None:
+        """Score every available item once and index items by position.
+        
+        Suitability only depends on the item, outfit type and weather, so
+        contexts copied from this one share the scores.
+        """
+        items = context.available_items
+        for i, item in enumerate(items):
+            item["_idx"] = i
+        context.suitability = np.fromiter(
+            (self._calculate_item_suitability(item, context) for item in items),
+            dtype=float, count=len(items)
+        )
+    
+    def _index_categories(self, categorized_items: Dict[str, List[Dict[str, Any]]],
+                          context: GenerationContext) -> None:
+        """Record where each category's selectable items sit in available_items."""
+        for category, items in categorized_items.items():
+            context.category_positions[category] = np.array(
+                [item["_idx"] for item in items if str(item.get("_id", ""))], dtype=np.intp
+            )
+        context.item_positions = {str(item.get("_id", "")): item["_idx"]
+                                  for item in context.available_items}
+    
+    def _item_suitability(self, item: Dict[str, Any], context: GenerationContext) -> float:
+        """Precomputed suitability of an item, or computed now if it wasn't indexed."""
+        idx = item.get("_idx")
+        if context.suitability is not None and idx is not None:
+            return float(context.suitability[idx])
+        return self._calculate_item_suitability(item, context)
+    
     def _select_base_items(self, categorized_items: Dict[str, List[Dict[str, Any]]], 
                           context: GenerationContext) -> List[Dict[str, Any]]:
         """Select base items for the outfit."""
@@ -583,48 +737,38 @@ class EnhancedOutfitGenerator:
         # Determine what categories we need
         required_categories = self._get_required_categories(context)
         
-        print(f"🔍 Looking for required categories: {required_categories}")
-        print(f"📁 Available categories: {list(categorized_items.keys())}")
+        # Outcome per required category, reported once at the end
+        outcomes = {}
         
         # Select items from required categories
         for category in required_categories:
             if category in categorized_items and categorized_items[category]:
-                print(f"✅ Found {len(categorized_items[category])} items in category: {category}")
-                
-                # Score items in this category
-                scored_items = []
-                for item in categorized_items[category]:
-                    # Skip if item is already selected or blacklisted
-                    item_id = str(item.get("_id", ""))
-                    if not item_id:
-                        continue
-                        
-                    if item_id in context.blacklisted_item_ids:
-                        print(f"   Skipping {item_id} - blacklisted")
-                        continue
-                    
-                    suitability = self._calculate_item_suitability(item, context)
-                    scored_items.append((item, suitability))
-                    print(f"   Item {item_id[:8]}: {item.get('category', 'unknown')} - suitability: {suitability:.2f}")
+                # Precomputed scores of this category's items, blacklisted ones masked out
+                positions = context.category_positions.get(category, np.empty(0, dtype=np.intp))
+                scores = context.suitability[positions]
+                if context.blacklisted_item_ids and len(positions):
+                    blocked = [context.item_positions[item_id] for item_id in context.blacklisted_item_ids
+                               if item_id in context.item_positions]
+                    scores = np.where(np.isin(positions, blocked), -np.inf, scores)
                 
-                # Sort by score and pick the best
-                if scored_items:
-                    scored_items.sort(key=lambda x: x[1], reverse=True)
-                    selected_item = scored_items[0][0]
+                # Pick the best (first one on ties)
+                best = int(np.argmax(scores)) if len(scores) else -1
+                if best >= 0 and scores[best] != -np.inf:
+                    selected_item = context.available_items[positions[best]]
                     
                     # Check if this item works with existing base items
                     if self._check_item_compatibility(selected_item, base_items, context):
                         base_items.append(selected_item)
                         context.blacklisted_item_ids.add(str(selected_item.get("_id", "")))
-                        print(f"✅ Added item to base: {selected_item.get('category', 'unknown')}")
+                        outcomes[category] = float(scores[best])
                     else:
-                        print(f"❌ Item not compatible with existing items")
+                        outcomes[category] = "incompatible"
                 else:
-                    print(f"❌ No suitable items found in category: {category}")
+                    outcomes[category] = "none suitable"
             else:
-                print(f"❌ No items found in required category: {category}")
+                outcomes[category] = "missing"
         
-        print(f"📦 Selected {len(base_items)} base items")
+        logger.debug("📦 Selected %s base items: %s", len(base_items), outcomes)
         return base_items
     
     def _get_required_categories(self, context: GenerationContext) -> List[str]:
@@ -638,40 +782,37 @@ class EnhancedOutfitGenerator:
         else:  # CASUAL, PARTY, DATE_NIGHT, TRAVEL
             return ["top", "bottom", "shoes"]
     
+    def _encode_items(self, items: List[Dict[str, Any]]) -> None:
+        """Store each item's color and style ids in COMPAT_TABLES (once per item dict)."""
+        for item in items:
+            if "_color_id" not in item:
+                item["_color_id"] = COMPAT_TABLES.color_id(item.get("color", ""))
+                item["_style_id"] = COMPAT_TABLES.style_id(item.get("style_tags"))
+    
+    def _compat_ids(self, items: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Color ids and style ids of ``items`` as index arrays."""
+        self._encode_items(items)
+        n = len(items)
+        return (np.fromiter((item["_color_id"] for item in items), dtype=np.intp, count=n),
+                np.fromiter((item["_style_id"] for item in items), dtype=np.intp, count=n))
+    
     def _check_item_compatibility(self, new_item: Dict[str, Any], 
                                  existing_items: List[Dict[str, Any]], 
                                  context: GenerationContext) -> bool:
         """Check if a new item is compatible with existing items."""
         if not existing_items:
             return True
-    
-    # FIX: Ensure color is string
-        new_color = new_item.get("color", "")
-        if new_color is None:  # Handle None case
-            new_color = "unknown"
-        else:
-            new_color = str(new_color).lower()
-    
-    # Check color harmony
-        for existing_item in existing_items:
-            existing_color = existing_item.get("color", "")
-            if existing_color is None:  # Handle None case
-                existing_color = "unknown"
-            else:
-                existing_color = str(existing_color).lower()
-            
-            harmony = ColorHarmony.calculate_harmony_score(new_color, existing_color)
-            if harmony < 0.5:  # Poor harmony
-                return False
-    
-    # Check style compatibility
-        new_tags = new_item.get("style_tags", [])
-        for existing_item in existing_items:
-            existing_tags = existing_item.get("style_tags", [])
-            compatibility = StyleCompatibility.calculate_style_compatibility(new_tags, existing_tags)
-            if compatibility < 0.5:  # Poor compatibility
+        
+        # Encode everything first: a new color grows the tables
+        self._encode_items([new_item])
+        self._encode_items(existing_items)
+        harmony = COMPAT_TABLES.harmony[new_item["_color_id"]]
+        style = COMPAT_TABLES.style[new_item["_style_id"]]
+        
+        # Poor color harmony or style compatibility with any item rules it out
+        for existing in existing_items:
+            if harmony[existing["_color_id"]] < 0.5 or style[existing["_style_id"]] < 0.5:
                 return False
-    
         return True
     
     def _add_complementary_items(self, base_items: List[Dict[str, Any]], 
@@ -728,33 +869,25 @@ class EnhancedOutfitGenerator:
                                       context: GenerationContext) -> float:
         """Calculate how well an item complements existing outfit items."""
         if not outfit_items:
-            return self._calculate_item_suitability(item, context)
-        
-        scores = []
-        
-        for outfit_item in outfit_items:
-            # Color harmony
-            color_score = ColorHarmony.calculate_harmony_score(
-                item.get("color", "").lower(),
-                outfit_item.get("color", "").lower()
-            )
-            
-            # Style compatibility
-            style_score = StyleCompatibility.calculate_style_compatibility(
-                item.get("style_tags", []),
-                outfit_item.get("style_tags", [])
-            )
-            
-            # Category synergy (some categories work better together)
-            cat1 = normalize_category(item.get("category"))
-            cat2 = normalize_category(outfit_item.get("category"))
-            category_synergy = self._get_category_synergy(cat1, cat2)
-            
-            # Combine scores
-            combined = (color_score * 0.4 + style_score * 0.4 + category_synergy * 0.2)
-            scores.append(combined)
+            return self._item_suitability(item, context)
+        
+        self._encode_items([item])
+        colors, styles = self._compat_ids(outfit_items)
+        color_scores = COMPAT_TABLES.harmony[item["_color_id"], colors]
+        style_scores = COMPAT_TABLES.style[item["_style_id"], styles]
+        
+        # Category synergy (some categories work better together)
+        cat1 = normalize_category(item.get("category"))
+        category_synergy = sum(
+            self._get_category_synergy(cat1, normalize_category(outfit_item.get("category")))
+            for outfit_item in outfit_items
+        )
         
-        return np.mean(scores) if scores else 0
+        # Combine scores; outfits are a handful of items, so plain sums beat
+        # building another array just to average it
+        combined = (float(color_scores.sum()) * 0.4 + float(style_scores.sum()) * 0.4
+                    + category_synergy * 0.2)
+        return combined / len(outfit_items)
     
     def _get_category_synergy(self, cat1: str, cat2: str) -> float:
         """Get synergy score between two categories."""
@@ -777,44 +910,22 @@ class EnhancedOutfitGenerator:
         if len(outfit_items) < context.config.min_items:
             return 0.0
         
-        scores = []
-        
         # Individual item suitability
-        for item in outfit_items:
-            suitability = self._calculate_item_suitability(item, context)
-            scores.append(suitability)
-        
-        # Pairwise compatibility
-        for i in range(len(outfit_items)):
-            for j in range(i + 1, len(outfit_items)):
-                item1 = outfit_items[i]
-                item2 = outfit_items[j]
-                
-                # Color harmony
-                color_score = ColorHarmony.calculate_harmony_score(
-                    item1.get("color", "").lower(),
-                    item2.get("color", "").lower()
-                )
-                
-                # Style compatibility
-                style_score = StyleCompatibility.calculate_style_compatibility(
-                    item1.get("style_tags", []),
-                    item2.get("style_tags", [])
-                )
-                
-                compatibility = (color_score + style_score) / 2
-                scores.append(compatibility)
+        suitability = [self._item_suitability(item, context) for item in outfit_items]
         
-        # Weather adaptation bonus
-        weather_bonus = self._calculate_weather_adaptation_bonus(outfit_items, context)
-        scores.append(weather_bonus)
+        # Pairwise compatibility (color harmony and style), every pair i < j
+        colors, styles = self._compat_ids(outfit_items)
+        first, second = np.triu_indices(len(outfit_items), k=1)
+        compatibility = (COMPAT_TABLES.harmony[colors[first], colors[second]]
+                         + COMPAT_TABLES.style[styles[first], styles[second]]) / 2
         
-        # Occasion suitability bonus
+        # Weather adaptation and occasion suitability bonuses
+        weather_bonus = self._calculate_weather_adaptation_bonus(outfit_items, context)
         occasion_bonus = self._calculate_occasion_bonus(outfit_items, context)
-        scores.append(occasion_bonus)
         
         # Calculate final score (weighted average)
-        return np.mean(scores) if scores else 0.0
+        total = sum(suitability) + float(compatibility.sum()) + weather_bonus + occasion_bonus
+        return total / (len(suitability) + len(compatibility) + 2)
     
     def _calculate_weather_adaptation_bonus(self, outfit_items: List[Dict[str, Any]], 
                                            context: GenerationContext) -> float:
@@ -832,7 +943,7 @@ class EnhancedOutfitGenerator:
         
         # Check for appropriate footwear in rain
         if "rain" in context.weather_profile.condition:
-            has_waterproof = any("waterproof" in item.get("style_tags", []) or 
+            has_waterproof = any("waterproof" in (item.get("style_tags") or ()) or 
                                 "boot" in str(item.get("category", "")).lower()
                                 for item in outfit_items)
             if has_waterproof:
@@ -880,14 +991,6 @@ class EnhancedOutfitGenerator:
                                    context: GenerationContext, 
                                    outfit_score: float) -> Dict[str, Any]:
         """Format outfit for API response."""
-        # Get base64 images for all items
-        for item in outfit_items:
-            if "image_file_id" in item:
-                try:
-                    item["image_base64"] = db_client.get_image_base64(item["image_file_id"])
-                except:
-                    item["image_base64"] = None
-        
         # Generate title and details
         title = choose_outfit_title(outfit_items, context.occasion, context.weather_profile)
         
@@ -911,7 +1014,7 @@ class EnhancedOutfitGenerator:
         return {
             "id": str(doc.get("_id")) if doc.get("_id") is not None else None,
             "image_file_id": doc.get("image_file_id"),
-            "image_base64": doc.get("image_base64"),
+            "image_path": doc.get("image_path"),
             "category": doc.get("category") or normalize_category(doc.get("category")),
             "color": doc.get("color"),
             "style_tags": doc.get("style_tags", []),
@@ -923,26 +1026,31 @@ class EnhancedOutfitGenerator:
     
     def generate_outfits(self, user_id: str, occasion: str, 
                          weather: Dict[str, Any], num_outfits: int = 3, 
-                         focus_item_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Generate outfits for a user."""
+                         focus_item_id: Optional[str] = None,
+                         items: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Generate outfits for a user.
+        
+        Pass ``items`` when the caller has already loaded the user's wardrobe
+        to avoid reading it from the database again.
+        """
         # ADDED DEBUGGING
-        print(f"🎨 ENTERING generate_outfits")
-        print(f"   occasion param: '{occasion}' (type: {type(occasion)})")
-        print(f"   user_id: '{user_id}'")
-        print(f"   weather: {weather}")
-        print(f"   num_outfits: {num_outfits}")
-        print(f"   focus_item_id: '{focus_item_id}'")
+        logger.debug("🎨 ENTERING generate_outfits")
+        logger.debug("   occasion param: '%s' (type: %s)", occasion, type(occasion))
+        logger.debug("   user_id: '%s'", user_id)
+        logger.debug("   weather: %s", weather)
+        logger.debug("   num_outfits: %s", num_outfits)
+        logger.debug("   focus_item_id: '%s'", focus_item_id)
     
         # Validate inputs with extra safety
         if occasion is None:
-            print("⚠️  occasion is None, setting to 'casual day'")
+            logger.warning("⚠️  occasion is None, setting to 'casual day'")
             occasion = "casual day"
         elif not isinstance(occasion, str):
-            print(f"⚠️  occasion is not a string ({type(occasion)}), converting")
+            logger.warning("⚠️  occasion is not a string (%s), converting", type(occasion))
             occasion = str(occasion)
     
         occasion = (occasion or "casual day").strip()
-        print(f"✅ Sanitized occasion: '{occasion}'")
+        logger.debug("✅ Sanitized occasion: '%s'", occasion)
             
         # Create cache key
         wp = build_weather_profile(weather)
@@ -951,36 +1059,29 @@ class EnhancedOutfitGenerator:
         # Check cache
         cached = self._cache.get(cache_key)
         if cached is not None:
-            print("✅ Using cached outfits")
+            logger.debug("✅ Using cached outfits")
             return cached
         
         # Get user's wardrobe items
-        print("📋 Getting user's wardrobe items...")
-        user_items = self.wardrobe_db.get_user_items(user_id)
-        print(f"   Found {len(user_items)} items in wardrobe")
+        logger.debug("📋 Getting user's wardrobe items...")
+        user_items = items if items is not None else self.wardrobe_db.get_user_items(user_id)
+        logger.debug("   Found %s items in wardrobe", len(user_items))
         
         if not user_items:
-            print("❌ No items in wardrobe!")
+            logger.debug("❌ No items in wardrobe!")
             return []
-        
-        # Show what categories we have
-        categories = {}
-        for item in user_items:
-            cat = normalize_category(item.get("category", "unknown"))
-            categories[cat] = categories.get(cat, 0) + 1
-        
-        print(f"   Categories: {categories}")
+        self._encode_items(user_items)
         
         # Show first few items
         for i, item in enumerate(user_items[:3]):
-            print(f"   Item {i+1}: {item.get('category', 'unknown')} - {item.get('color', 'unknown')}")
+            logger.debug("   Item %s: %s - %s", i+1, item.get('category', 'unknown'), item.get('color', 'unknown'))
         
         # Prepare generation context
         outfit_type = self._determine_outfit_type(occasion)
         config = self._get_outfit_config(outfit_type)
         
-        print(f"   Outfit type: {outfit_type.value}")
-        print(f"   Config: {config.min_items}-{config.max_items} items")
+        logger.debug("   Outfit type: %s", outfit_type.value)
+        logger.debug("   Config: %s-%s items", config.min_items, config.max_items)
         
         # Get focus item if specified
         focus_item = None
@@ -988,69 +1089,73 @@ class EnhancedOutfitGenerator:
             focus_item = next((item for item in user_items 
                              if str(item.get("_id")) == str(focus_item_id)), None)
             if focus_item:
-                print(f"   Focus item: {focus_item.get('category', 'unknown')}")
+                logger.debug("   Focus item: %s", focus_item.get('category', 'unknown'))
             else:
-                print(f"   Focus item not found: {focus_item_id}")
+                logger.debug("   Focus item not found: %s", focus_item_id)
         
         # Categorize items
         categorized_items = self._categorize_items(user_items)
-        print(f"   Categorized into: {list(categorized_items.keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("   Categories: %s", {cat: len(group) for cat, group in categorized_items.items()})
+        
+        base_context = GenerationContext(
+            user_id=user_id,
+            occasion=occasion,
+            weather_profile=wp,
+            outfit_type=outfit_type,
+            config=config,
+            available_items=user_items,
+            focus_item=focus_item,
+        )
+        self._precompute_context(base_context)
+        self._index_categories(categorized_items, base_context)
         
         # Generate multiple outfits
         outfits = []
         used_outfit_combinations = set()
         
-        print(f"\n🔄 Generating up to {num_outfits} outfits...")
+        logger.debug("🔄 Generating up to %s outfits...", num_outfits)
         
         for attempt in range(config.max_generation_attempts):
             if len(outfits) >= num_outfits:
                 break
             
-            print(f"\n   Attempt {attempt + 1}:")
+            logger.debug("   Attempt %s:", attempt + 1)
             
-            # Create new context for this attempt
-            context = GenerationContext(
-                user_id=user_id,
-                occasion=occasion,
-                weather_profile=wp,
-                outfit_type=outfit_type,
-                config=config,
-                available_items=user_items,
-                focus_item=focus_item,
-                blacklisted_item_ids=set()
-            )
+            # Fresh blacklist for this attempt; item scores are shared
+            context = replace(base_context, blacklisted_item_ids=set())
             
             # Select base items
             base_items = self._select_base_items(categorized_items, context)
-            print(f"      Selected {len(base_items)} base items")
+            logger.debug("      Selected %s base items", len(base_items))
             
             if len(base_items) < config.min_items:
-                print(f"      ❌ Not enough base items ({len(base_items)} < {config.min_items})")
+                logger.debug("      ❌ Not enough base items (%s < %s)", len(base_items), config.min_items)
                 continue  # Not enough items for a complete outfit
             
             # Add complementary items
             outfit_items = self._add_complementary_items(base_items, categorized_items, context)
             outfit_items = self._deduplicate_items(outfit_items)
-            print(f"      After adding complementary: {len(outfit_items)} items")
+            logger.debug("      After adding complementary: %s items", len(outfit_items))
             
             # Ensure minimum items
             if len(outfit_items) < config.min_items:
-                print(f"      ❌ Not enough total items ({len(outfit_items)} < {config.min_items})")
+                logger.debug("      ❌ Not enough total items (%s < %s)", len(outfit_items), config.min_items)
                 continue
             
             # Calculate outfit score
             outfit_score = self._calculate_outfit_score(outfit_items, context)
-            print(f"      Outfit score: {outfit_score:.2f}")
+            logger.debug("      Outfit score: %.2f", outfit_score)
             
             # Check if this combination is unique
             item_ids = tuple(sorted(str(item.get("_id")) for item in outfit_items))
             if item_ids in used_outfit_combinations:
-                print(f"      ❌ Duplicate combination")
+                logger.debug("      ❌ Duplicate combination")
                 continue
             
             # Only keep outfits with decent score
             if outfit_score < 0.5:
-                print(f"      ❌ Score too low ({outfit_score:.2f} < 0.5)")
+                logger.debug("      ❌ Score too low (%.2f < 0.5)", outfit_score)
                 continue
             
             # Format outfit for response
@@ -1058,9 +1163,9 @@ class EnhancedOutfitGenerator:
             
             outfits.append(outfit)
             used_outfit_combinations.add(item_ids)
-            print(f"      ✅ Added outfit {len(outfits)} with score {outfit_score:.2f}")
+            logger.debug("      ✅ Added outfit %s with score %.2f", len(outfits), outfit_score)
         
-        print(f"\n🎉 Generated {len(outfits)} outfits")
+        logger.info("🎉 Generated %s outfits", len(outfits))
         
         # Sort by score
         outfits.sort(key=lambda x: x.get("score", 0), reverse=True)
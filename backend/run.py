@@ -6,10 +6,10 @@ Run with: python run.py
 
 import os
 import sys
-from dotenv import load_dotenv
+from config import load_env
 
 # Load environment variables
-load_dotenv()
+load_env()
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -54,7 +54,8 @@ try:
         print(f"📁 Upload folder: {app.config['UPLOAD_FOLDER']}")
         print(f"🌐 API URL: http://localhost:8080")
         print(f"📚 API Docs: http://localhost:8080/")
-        print(f"🔧 Debug mode: ON")
+        print(f"🔧 Debug mode: {'ON' if os.getenv('FLASK_DEBUG') == '1' else 'OFF'}")
+        print("🏭 For production use: gunicorn -c gunicorn.conf.py api:app")
         print("="*60)
         print("\nTo get started:")
         print("1. Open index.html in your browser")
@@ -64,7 +65,8 @@ try:
         print("="*60 + "\n")
         
         try:
-            app.run(host='0.0.0.0', port=8080, debug=True, threaded=True)
+            app.run(host='0.0.0.0', port=8080, debug=os.getenv("FLASK_DEBUG") == "1",
+                    use_reloader=False, threaded=True)
         except KeyboardInterrupt:
             print("\n👋 Server stopped by user")
         except Exception as e:
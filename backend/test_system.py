@@ -5,8 +5,8 @@ Run:
 """
 
 import os
-from dotenv import load_dotenv
-load_dotenv()
+from config import load_env
+load_env()
 
 from wardrobe_database import WardrobeDatabase
 from outfit_generator import OutfitGenerator
@@ -1,10 +1,41 @@
 from __future__ import annotations
 
+import io
 import os
-from typing import List, Dict, Optional, Any
+import base64
+import logging
+from typing import List, Dict, Optional, Any, Tuple
+
+from PIL import Image
+
 from mongodb_client import db_client
 from style_scoring import normalize_category  # FIX: Import normalize_category
 
+logger = logging.getLogger(__name__)
+
+# Thumbnails are stored on the item document so list views never need GridFS
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_QUALITY = 75
+
+
+def make_thumbnail_bytes(image_path: str) -> bytes:
+    """Render a small JPEG thumbnail of an image."""
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        img.thumbnail(THUMBNAIL_SIZE)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buf.getvalue()
+
+
+def make_thumbnail_base64(image_path: str) -> Optional[str]:
+    """Return a small JPEG thumbnail of an image as base64, or None on failure."""
+    try:
+        return base64.b64encode(make_thumbnail_bytes(image_path)).decode("utf-8")
+    except Exception as e:
+        logger.warning("⚠️  Could not create thumbnail for %s: %s", image_path, e)
+        return None
+
 
 class WardrobeDatabase:
     """Complete wardrobe database using MongoDBClient."""
@@ -17,31 +48,62 @@ class WardrobeDatabase:
                          category: str = None,
                          analysis: Dict[str, Any] = None) -> str:
         """Add clothing item to wardrobe with analysis."""
+        doc = None
         try:
-            # Store image in GridFS
-            file_id = self.db.save_image(image_path, user_id)
-            
-            # Create document
-            doc = {
-                "image_file_id": file_id,
-                "image_path": image_path,
-                "description": description,
-                "user_id": user_id,
-                "category": category or (analysis.get("category") if analysis else "unknown"),
-                "color": analysis.get("color", "unknown") if analysis else "unknown",
-                "style_tags": analysis.get("style_tags", []) if analysis else [],
-                "season": analysis.get("season", "all-season") if analysis else "all-season",
-                "formality": analysis.get("formality", "casual") if analysis else "casual",
-                "analysis": analysis or {},
-            }
+            doc = self._build_item_doc(image_path, description, user_id, category, analysis)
             
             # Save to MongoDB
             item_id = self.db.save_clothing_item(doc)
             return item_id
             
         except Exception as e:
+            # Don't leave the queued image to be uploaded as an orphan
+            if doc is not None:
+                self.db.delete_image(doc["image_file_id"])
             raise Exception(f"Failed to add clothing item: {str(e)}")
     
+    def add_clothing_items(self, items: List[Dict[str, Any]]) -> List[str]:
+        """Add several analyzed items with a single bulk insert.
+        
+        Each entry takes the keyword arguments of add_clothing_item; the
+        new ids are returned in the same order.
+        """
+        docs = []
+        try:
+            for item in items:
+                docs.append(self._build_item_doc(**item))
+            return self.db.save_clothing_items(docs)
+        except Exception as e:
+            # Don't leave the queued images to be uploaded as orphans
+            for doc in docs:
+                self.db.delete_image(doc["image_file_id"])
+            raise Exception(f"Failed to add clothing items: {str(e)}")
+    
+    def _build_item_doc(self, image_path: str, description: str,
+                        user_id: str = "anonymous",
+                        category: str = None,
+                        analysis: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Build the stored document for an item, queueing its image for GridFS."""
+        # Store image in GridFS (uploaded in the background)
+        file_id = self.db.save_image_deferred(image_path, user_id)
+        
+        # Create document
+        doc = {
+            "image_file_id": file_id,
+            "image_path": image_path,
+            "description": description,
+            "user_id": user_id,
+            "category": category or (analysis.get("category") if analysis else "unknown"),
+            "color": analysis.get("color") if analysis else None,
+            "style_tags": (analysis.get("style_tags") if analysis else None) or [],
+            "season": analysis.get("season", "all-season") if analysis else "all-season",
+            "formality": analysis.get("formality", "casual") if analysis else "casual",
+            "analysis": analysis or {},
+            "thumb_b64": make_thumbnail_base64(image_path),
+        }
+        # Fill defaults once here so readers can rely on every field
+        return self._normalize_item(doc)
+    
     def add_clothing_item_with_analysis(self, item_data: Dict, analysis: Dict) -> str:
         """Add clothing item with pre-existing analysis."""
         return self.add_clothing_item(
@@ -52,48 +114,69 @@ class WardrobeDatabase:
             analysis=analysis
         )
     
-    def get_user_items(self, user_id: str = "anonymous") -> List[Dict[str, Any]]:
-        """Get all wardrobe items for a user."""
-        try:
-            items = self.db.list_clothing_items(user_id=user_id, limit=200)
+    def _normalize_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Ensure an item document has all fields the generators rely on.
         
-            # Ensure all items have required fields
-            for item in items:
-                # Ensure _id is string
-                if "_id" in item and not isinstance(item["_id"], str):
-                    item["_id"] = str(item["_id"])
-            
-              # Ensure category exists and is normalized
-                if "category" not in item or not item["category"]:
-                    item["category"] = "unknown"
-                else:
-                    item["category"] = normalize_category(item["category"])
-            
-            # FIX: Ensure color is NEVER None - default to "unknown"
-                if "color" not in item or item["color"] is None:
-                    item["color"] = "unknown"
-            
-            # Ensure style_tags exists
-                if "style_tags" not in item:
-                    item["style_tags"] = []
-            
-            # Ensure formality exists
-                if "formality" not in item:
-                    item["formality"] = "casual"
-            
-            # Ensure season exists
-                if "season" not in item:
-                    item["season"] = "all-season"
+        Applied when items are written (see migrate_items.py for older
+        documents), so list reads return them as stored.
+        """
+        # Ensure _id is string
+        if "_id" in item and not isinstance(item["_id"], str):
+            item["_id"] = str(item["_id"])
+        
+        # Ensure category exists and is normalized
+        if "category" not in item or not item["category"]:
+            item["category"] = "unknown"
+        else:
+            item["category"] = normalize_category(item["category"])
+        
+        # FIX: Ensure color is NEVER None - default to "unknown"
+        if "color" not in item or item["color"] is None:
+            item["color"] = "unknown"
+        
+        # Ensure style_tags exists
+        if not item.get("style_tags"):
+            item["style_tags"] = []
+        
+        # Ensure formality exists
+        if "formality" not in item:
+            item["formality"] = "casual"
         
-            return items
+        # Ensure season exists
+        if "season" not in item:
+            item["season"] = "all-season"
+        
+        return item
+    
+    def get_user_items(self, user_id: str = "anonymous") -> List[Dict[str, Any]]:
+        """Get all wardrobe items for a user (without image data)."""
+        try:
+            return self.db.list_clothing_items(user_id=user_id, limit=200, include_images=False)
         except Exception as e:
-            print(f"Error getting user items: {e}")
+            logger.warning("Error getting user items: %s", e)
             return []
     
+    def get_user_items_page(self, user_id: str = "anonymous", skip: int = 0,
+                            limit: int = 100, 
+                            include_images: bool = True) -> Tuple[List[Dict[str, Any]], bool]:
+        """Get one page of a user's items and whether more items follow.
+        
+        Pagination happens in the database; one extra item is fetched to
+        work out ``has_more`` without a separate count.
+        """
+        items = self.db.list_clothing_items(user_id=user_id, limit=limit + 1, skip=skip,
+                                            include_images=include_images)
+        has_more = len(items) > limit
+        return items[:limit], has_more
+    
     def get_item(self, item_id: str) -> Optional[Dict[str, Any]]:
         """Get specific wardrobe item by ID."""
         return self.db.get_clothing_item(item_id)
     
+    def get_image_base64(self, file_id: str) -> str:
+        """Get an item's image as a base64 string."""
+        return self.db.get_image_base64(file_id)
+    
     def get_items_by_category(self, category: str, user_id: str = "anonymous") -> List[Dict[str, Any]]:
         """Get items filtered by category.
         
@@ -108,8 +191,7 @@ class WardrobeDatabase:
     
     def count_items(self, user_id: str = "anonymous") -> int:
         """Count total items in wardrobe."""
-        items = self.get_user_items(user_id)
-        return len(items)
+        return sum(self.db.count_by_category(user_id).values())
     
     def count_by_category(self, user_id: str = "anonymous") -> Dict[str, int]:
         """Count items by category."""
@@ -137,7 +219,7 @@ class WardrobeDatabase:
                 continue
                 
             # Search in style tags
-            tags = item.get("style_tags", [])
+            tags = item.get("style_tags") or ()
             if any(query_lower in tag.lower() for tag in tags):
                 results.append(item)
                 continue
@@ -9,6 +9,18 @@ import requests
 # Simple in-process cache (per city+units)
 _CACHE: Dict[str, Tuple[Dict[str, Any], float]] = {}
 _TTL_SECONDS = 15 * 60
+_MAX_ENTRIES = 1024
+
+
+def _cache_put(key: str, data: Dict[str, Any], now: float) -> None:
+    """Store a result, evicting expired (then oldest) entries when full."""
+    if key not in _CACHE and len(_CACHE) >= _MAX_ENTRIES:
+        for k in [k for k, (_, ts) in _CACHE.items() if now - ts >= _TTL_SECONDS]:
+            del _CACHE[k]
+        if len(_CACHE) >= _MAX_ENTRIES:
+            del _CACHE[next(iter(_CACHE))]
+    _CACHE.pop(key, None)
+    _CACHE[key] = (data, now)
 
 
 def get_weather(city: str, units: str = "metric", force_refresh: bool = False) -> Dict[str, Any]:
@@ -59,7 +71,7 @@ def get_weather(city: str, units: str = "metric", force_refresh: bool = False) -
             "confidence": 0.4,
             "note": "No OPENWEATHER_API_KEY set; returning mock weather for demo.",
         }
-        _CACHE[cache_key] = (out, now)
+        _cache_put(cache_key, out, now)
         return out
 
     url = "https://api.openweathermap.org/data/2.5/weather"
@@ -107,7 +119,7 @@ def get_weather(city: str, units: str = "metric", force_refresh: bool = False) -
         "confidence": 1.0,
     }
 
-    _CACHE[cache_key] = (out, now)
+    _cache_put(cache_key, out, now)
     return out
 
 def get_detailed_weather_recommendations(weather: Dict) -> Dict: